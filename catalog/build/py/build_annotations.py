@@ -4,7 +4,7 @@ from linkml_runtime import SchemaView
 import pandas as pd
 import numpy as np
 from generated_schema.annotations import Annotation, ReleaseOneAnnotation, ReleaseOneFlaggerAnnotation
-from build_help import columns_mapper, format_errors_by_file, load_data_for_releases, get_file_sizes_from_uris, validation_input_formatter
+from build_help import SPEC_CHUNK_SIZE, SPEC_DRY_RUN, FileSizeRequestState, columns_mapper, format_errors_by_file, iter_release_chunks, load_data_for_releases, get_file_sizes_from_uris, print_file_size_request_estimate, print_releases_plan, take_source_parse_stats, validation_input_formatter, write_chunks_to_csv
 from reports import EntityTypeReport, get_error_strings_per_file, make_uri_error_accumulator, generate_catalog_report
 
 RELEASE_1_CAT_ANNOTATION_TYPES = {"chm13": "CAT_genes_chm13", "hg38": "CAT_genes_hg38"}
@@ -93,7 +93,9 @@ RELEASE_SPECIFIC_DATA = [
                     model=ReleaseOneFlaggerAnnotation
                 )
             ],
-            "contextual_input_formatter": lambda df, meta_error_sets, context: (df, [file_errors for error_set in meta_error_sets for file_errors in error_set])
+            "contextual_input_formatter": lambda df, meta_error_sets, context: (df, [file_errors for error_set in meta_error_sets for file_errors in error_set]),
+            # The release 1 index files are frozen, so their validated output is reused across builds
+            "materialize": True
         }
     },
     {
@@ -130,25 +132,49 @@ def get_type_df(source_df, type):
     return source_df.assign(annotation_type=pd.Series(type, index=source_df.index))
 
 
-def build_annotations():
-    loaded_dfs, load_metadata = load_data_for_releases(RELEASE_SPECIFIC_DATA, DOWNLOADS_FOLDER_PATH)
-    annotations_df = loaded_dfs["ANNOTATIONS"]
-    validation_errors = {file_name: errors for release_errors in load_metadata["ANNOTATIONS"].values() for file_name, errors in release_errors if errors}
-    
+def build_annotations(file_size_manifest_path=None):
+    if SPEC_DRY_RUN:
+        print_releases_plan(RELEASE_SPECIFIC_DATA)
+        print_file_size_request_estimate("annotation", OUTPUT_FILE_PATH, "location", file_size_manifest_path)
+        return
+    handle_uri_error, uri_errors = make_uri_error_accumulator()
+    file_size_stats = {}
+    # Shared by the chunks when loading in chunks, so that the previous build's sizes are loaded once and request rates carry over
+    file_size_request_state = FileSizeRequestState()
+    get_annotation_file_sizes = lambda df: get_file_sizes_from_uris(
+        df["location"], "annotation", handle_uri_error, stats=file_size_stats, previous_build=(OUTPUT_FILE_PATH, REPORT_PATH, "location"), manifest_path=file_size_manifest_path, request_state=file_size_request_state
+    )
+
+    if SPEC_CHUNK_SIZE:
+        # Load, validate and output the annotations incrementally
+        validation_errors = {}
+        def iter_annotation_chunks():
+            for df, release_errors, _ in iter_release_chunks(RELEASE_SPECIFIC_DATA, "ANNOTATIONS", DOWNLOADS_FOLDER_PATH, SPEC_CHUNK_SIZE):
+                for file_name, errors in release_errors:
+                    if errors: validation_errors.setdefault(file_name, []).extend(errors)
+                yield df
+        # Columns missing from some sources are filled as when accumulating releases
+        write_chunks_to_csv(iter_annotation_chunks(), OUTPUT_FILE_PATH, lambda df: df.assign(file_size=get_annotation_file_sizes(df)), fill_value="N/A")
+    else:
+        loaded_dfs, load_metadata = load_data_for_releases(RELEASE_SPECIFIC_DATA, DOWNLOADS_FOLDER_PATH, profile_name="annotations")
+        annotations_df = loaded_dfs["ANNOTATIONS"]
+        validation_errors = {file_name: errors for release_errors in load_metadata["ANNOTATIONS"].values() for file_name, errors in release_errors if errors}
+
     if validation_errors:
         print(f"\nValidation errors:\n\n{format_errors_by_file(validation_errors)}")
         print(f"\nFound errors in {len(validation_errors)} source files\n")
-    
-    handle_uri_error, uri_errors = make_uri_error_accumulator()
-    output_df = annotations_df.assign(file_size=get_file_sizes_from_uris(annotations_df["location"], "annotation", handle_uri_error))
+
+    if not SPEC_CHUNK_SIZE:
+        output_df = annotations_df.assign(file_size=get_annotation_file_sizes(annotations_df))
+        output_df.to_csv(OUTPUT_FILE_PATH, index=False)
 
     EntityTypeReport(
         validation_errors=get_error_strings_per_file(validation_errors),
-        file_uri_errors=uri_errors
+        file_uri_errors=uri_errors,
+        file_size_stats=file_size_stats,
+        parse_stats=take_source_parse_stats()
     ).save_to(REPORT_PATH)
 
-    output_df.to_csv(OUTPUT_FILE_PATH, index=False)
-
     print("\nAnnotation processing complete!\n")
 
 
@@ -3,7 +3,8 @@ from linkml_runtime import SchemaView
 import pandas as pd
 import numpy as np
 from generated_schema.assemblies import Assembly, ReleaseOneAssembly
-from build_help import columns_mapper, format_errors_by_file, download_file, validation_input_formatter, load_data_for_releases, get_file_sizes_from_uris
+from build_help import SPEC_DRY_RUN, columns_mapper, format_errors_by_file, validation_input_formatter, load_data_for_releases, get_file_sizes_from_uris, print_file_size_request_estimate, print_releases_plan, take_source_parse_stats
+from downloads import download_file
 from reports import EntityTypeReport, get_error_strings_per_file, make_uri_error_accumulator, generate_catalog_report
 
 # Determine the base directory of the script
@@ -30,10 +31,13 @@ RELEASE_SPECIFIC_DATA = [
                     "sample": "sample_id",
                     "haplotype": "haplotype",
                     "aws_fasta": "assembly",
+                    "gcp_fasta": "assembly_mirror",
                     "fasta_sha256": "fasta_sha256"
                 }
             },
-            "contextual_input_formatter": validation_input_formatter(ReleaseOneAssembly, ASSEMBLIES_SCHEMAVIEW)
+            "contextual_input_formatter": validation_input_formatter(ReleaseOneAssembly, ASSEMBLIES_SCHEMAVIEW, retained_columns=["assembly_mirror"]),
+            # The release 1 index file is frozen, so its validated output is reused across builds
+            "materialize": True
         }
     },
     {
@@ -96,11 +100,16 @@ def format_release_1_assemblies_df(data):
     ).drop_duplicates(subset=["sample", "haplotype"], keep="first")
     return outputData
 
-def build_assemblies():
+def build_assemblies(file_size_manifest_path=None):
+    if SPEC_DRY_RUN:
+        print(f"UCSC browser table: {UCSC_BROWSER_TABLE_URL}")
+        print_releases_plan(RELEASE_SPECIFIC_DATA)
+        print_file_size_request_estimate("assembly", OUTPUT_FILE_PATH, "assembly", file_size_manifest_path)
+        return
     # Download the files from Github and load them as dataframes
     ucsc_browser_path = download_file(UCSC_BROWSER_TABLE_URL, DOWNLOADS_FOLDER_PATH)
     ucsc_browser_df = pd.read_csv(ucsc_browser_path, sep=",")[["assembly_name", "browser"]]
-    loaded_dfs, load_metadata = load_data_for_releases(RELEASE_SPECIFIC_DATA, DOWNLOADS_FOLDER_PATH)
+    loaded_dfs, load_metadata = load_data_for_releases(RELEASE_SPECIFIC_DATA, DOWNLOADS_FOLDER_PATH, profile_name="assemblies")
     assembly_df = loaded_dfs["ASSEMBLIES"]
     validation_errors = {file_name: errors for file_name, errors in load_metadata["ASSEMBLIES"].values() if errors}
 
@@ -114,14 +123,27 @@ def build_assemblies():
     )
     combined_df["browser"] = combined_df["browser"].fillna("")
 
-    # Get file sizes
+    # Get file sizes, using the GCP copies of release 1 assemblies as mirrors
     handle_uri_error, uri_errors = make_uri_error_accumulator()
-    output_df = combined_df.assign(file_size=get_file_sizes_from_uris(combined_df["assembly"], "assembly", handle_uri_error))
+    file_size_stats = {}
+    output_df = combined_df.assign(
+        file_size=get_file_sizes_from_uris(
+            combined_df["assembly"],
+            "assembly",
+            handle_uri_error,
+            stats=file_size_stats,
+            previous_build=(OUTPUT_FILE_PATH, REPORT_PATH, "assembly"),
+            mirror_uris=combined_df["assembly_mirror"],
+            manifest_path=file_size_manifest_path
+        )
+    ).drop(columns=["assembly_mirror"])
 
     # Create report
     EntityTypeReport(
         validation_errors=get_error_strings_per_file(validation_errors),
-        file_uri_errors=uri_errors
+        file_uri_errors=uri_errors,
+        file_size_stats=file_size_stats,
+        parse_stats=take_source_parse_stats()
     ).save_to(REPORT_PATH)
 
     # Output assemblies
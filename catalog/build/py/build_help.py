@@ -1,8 +1,70 @@
-from pathlib import Path
-from urllib.parse import urlparse, quote as url_quote, unquote as url_unquote
-import requests
+import hashlib
+import json
+import multiprocessing
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field, replace
+from functools import cache
+import numpy as np
 import pandas as pd
-from pydantic import ValidationError
+from linkml_runtime import SchemaView
+from pydantic import TypeAdapter, ValidationError
+from compiled_validation import get_equality_mask, get_rows_to_validate, match_strings
+from downloads import OFFLINE, download_file_with_info
+from file_size_cache import CachedFileSize, FileSizeCache
+from file_size_manifest import FILE_SIZE_MANIFEST_PATH, get_file_sizes_from_manifest, load_file_size_manifest
+from hedging import LatencyTracker, hedge
+from http_transport import get_default_session, make_session
+from rate_control import HostRateController, RateControlledSession
+from s3_listing import get_s3_object_url, group_s3_uris_by_prefix, list_s3_objects
+from spec_materialization import SPEC_MATERIALIZE, get_spec_fingerprint, load_materialized_output, save_materialized_output
+from spec_profiling import SpecProfile, get_df_memory, run_profiled_step, save_spec_profile
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+except ImportError:
+    pa = None
+
+# Number of threads used to download, parse and validate independent source files
+SPEC_JOBS = int(os.environ.get("HPRC_SPEC_JOBS", 8))
+# Whether to record the time and dataframe sizes of each step of loading specs, printing them as a tree and saving them as JSON
+SPEC_PROFILE = os.environ.get("HPRC_SPEC_PROFILE", "") not in ("", "0")
+SPEC_PROFILES_FOLDER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../temporary/spec_profiles")
+# Maximum number of rows of each source file to load at once, with the output of chunked builds being written incrementally; if 0, source files are loaded whole
+SPEC_CHUNK_SIZE = int(os.environ.get("HPRC_SPEC_CHUNK_SIZE", 0))
+CHUNK_PARTS_FOLDER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../temporary/chunk_parts")
+# Whether builds only print the specs they would load, the source files they would download, and the number of file size requests they would be expected to make
+SPEC_DRY_RUN = os.environ.get("HPRC_SPEC_DRY_RUN", "") not in ("", "0")
+# Whether to parse source files that are read as strings using the PyArrow CSV reader, storing their values in PyArrow-backed string columns (requires the `pyarrow` package)
+ARROW_STRINGS = os.environ.get("HPRC_ARROW_STRINGS", "") not in ("", "0")
+ARROW_STRING_DTYPE = "string[pyarrow]"
+# Number of processes used to validate large source files in chunks of rows; if less than 2, source files are validated in the threads that load them
+VALIDATION_PROCESSES = int(os.environ.get("HPRC_VALIDATION_PROCESSES", 0))
+# Minimum number of rows in each chunk validated by a worker process
+VALIDATION_CHUNK_MIN_ROWS = 5000
+# Options of `read_csv` that the PyArrow CSV reader handles in the same way as the default engine
+ARROW_ENGINE_READ_OPTIONS = {"sep", "dtype", "keep_default_na", "usecols"}
+# Number of concurrent HEAD requests used to fetch file sizes
+FILE_SIZE_JOBS = int(os.environ.get("HPRC_FILE_SIZE_JOBS", 16))
+# Source of file sizes: "head" to make a HEAD request per file, or "listing" to get the sizes of S3 files from bucket listings
+FILE_SIZE_SOURCE = os.environ.get("HPRC_FILE_SIZE_SOURCE", "head")
+# Whether to reuse file sizes from the previous build, only requesting files that failed in it
+FILE_SIZE_RETRY_FAILURES = os.environ.get("HPRC_FILE_SIZE_RETRY_FAILURES", "") not in ("", "0")
+# Retry settings for requests of previously-failed files
+FILE_SIZE_RETRIES = 4
+FILE_SIZE_RETRY_BASE_DELAY = 1.0
+FILE_SIZE_RETRY_MAX_DELAY = 30.0
+# Shard of the unique file URLs to request, given as "i/n", to split requests across machines
+FILE_SIZE_SHARD = os.environ.get("HPRC_FILE_SIZE_SHARD") or None
+FILE_SIZE_SHARDS_FOLDER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../temporary/file_size_shards")
 
 class HprcValidationError(Exception):
     pass
@@ -14,6 +76,9 @@ class HprcFieldValidationError(HprcValidationError):
         self.row = row
         self.field = field
 
+    def __reduce__(self):
+        return (type(self), (self.message, self.row, self.field))
+
 class HprcMultiFieldValidationError(HprcValidationError):
     def __init__(self, message, row, fields):
         super().__init__(message)
@@ -21,6 +86,9 @@ class HprcMultiFieldValidationError(HprcValidationError):
         self.row = row
         self.fields = fields
 
+    def __reduce__(self):
+        return (type(self), (self.message, self.row, self.fields))
+
 
 def map_columns(df, **mappers):
     mapped_columns = {name: df[name].map(mapper) for name, mapper in mappers.items()}
@@ -33,22 +101,35 @@ def columns_mapper(**mappers):
 def get_pydantic_field_names(model):
     return model.__pydantic_fields__.keys()
 
+INTEGER_PARSE_ERROR_MESSAGE = "Unable to parse value as integer"
+FLOAT_PARSE_ERROR_MESSAGE = "Unable to parse value as float"
+BOOLEAN_PARSE_ERROR_MESSAGE = "Unable to parse value as boolean"
+
+# Values that are parsed in the same way by `int` and `float` as by the vectorized casts; `int` and `float` also accept whitespace, underscores, non-ASCII digits and such,
+# so other values are left to the scalar mappers
+VECTORIZED_INTEGER_PATTERN = r"[+-]?[0-9]{1,18}"
+VECTORIZED_FLOAT_PATTERN = r"[+-]?(?:[0-9]+\.?[0-9]*|\.[0-9]+)(?:[eE][+-]?[0-9]+)?"
+
 def cast_int(value, row, field):
     try:
         return int(value)
     except ValueError:
-        raise HprcFieldValidationError("Unable to parse value as integer", row, field)
+        raise HprcFieldValidationError(INTEGER_PARSE_ERROR_MESSAGE, row, field)
 
 def cast_float(value, row, field):
     try:
         return float(value)
     except ValueError:
-        raise HprcFieldValidationError("Unable to parse value as float", row, field)
+        raise HprcFieldValidationError(FLOAT_PARSE_ERROR_MESSAGE, row, field)
 
 def cast_bool(value, row, field):
     if value == "TRUE": return True
     if value == "FALSE": return False
-    raise HprcFieldValidationError("Unable to parse value as boolean", row, field)
+    raise HprcFieldValidationError(BOOLEAN_PARSE_ERROR_MESSAGE, row, field)
+
+PARSE_ERROR_MESSAGES = {cast_int: INTEGER_PARSE_ERROR_MESSAGE, cast_float: FLOAT_PARSE_ERROR_MESSAGE, cast_bool: BOOLEAN_PARSE_ERROR_MESSAGE}
+# Strings without a match can't be parsed by the mapper: `int` and `float` require a (possibly non-ASCII) digit, or, for `float`, "inf" or "nan"
+NUMBER_REQUIRED_PATTERNS = {cast_int: re.compile(r"\d"), cast_float: re.compile(r"\d|inf|nan", re.IGNORECASE)}
 
 def get_slot_type_mapper(slot, enum_names):
     if slot.range in enum_names: return None
@@ -64,49 +145,186 @@ def get_slot_type_mapper(slot, enum_names):
         case _:
             raise Exception(f"Handling not implemented for range {slot.range}")
 
+@cache
 def get_field_type_mappers(schemaview, model):
     slot_names = get_pydantic_field_names(model)
     enum_names = schemaview.all_enums().keys()
     return {name: mapper for name, mapper in ((name, get_slot_type_mapper(schemaview.induced_slot(name), enum_names)) for name in slot_names) if mapper is not None}
 
-def cast_row(source_row_dict, row_index, field_type_mappers):
-    return {
-        k: None if v == "" else field_type_mappers[k](v, row_index, k) if k in field_type_mappers else v
-        for k, v in source_row_dict.items()
-    }
+def cast_column(column, mapper):
+    """
+    Cast the values of a column with a field type mapper, and empty strings to `None`, returning an array of the cast values and a boolean array of which values couldn't be cast.
+    Integers, floats and booleans in their usual forms are cast column-wise, and strings that can't be numbers are rejected without parsing;
+    any other values are cast with the mapper itself, so that they're accepted or rejected in the same way.
+    """
+    values = column.to_numpy(dtype=object, copy=True)
+    is_empty = get_equality_mask(column, "", values)
+    values[is_empty] = None
+    is_failed = np.zeros(len(column), dtype=bool)
+    if mapper is None:
+        return (values, is_failed)
+    if mapper is cast_bool:
+        is_true = get_equality_mask(column, "TRUE", values)
+        is_false = get_equality_mask(column, "FALSE", values)
+        values[is_true] = True
+        values[is_false] = False
+        return (values, ~(is_empty | is_true | is_false))
+    if mapper is cast_int:
+        is_vectorized = match_strings(column, VECTORIZED_INTEGER_PATTERN, full=True)
+        values[is_vectorized] = pd.to_numeric(column[is_vectorized], errors="coerce").to_numpy(dtype=object)
+    elif mapper is cast_float:
+        is_vectorized = match_strings(column, VECTORIZED_FLOAT_PATTERN, full=True)
+        # Parsed by NumPy, which rounds in the same way as `float`, unlike `pd.to_numeric`
+        values[is_vectorized] = values[is_vectorized].astype(float).astype(object)
+    else:
+        is_vectorized = np.zeros(len(column), dtype=bool)
+    required_pattern = NUMBER_REQUIRED_PATTERNS.get(mapper)
+    for i in np.flatnonzero(~(is_empty | is_vectorized)).tolist():
+        value = values[i]
+        if required_pattern is not None and isinstance(value, str) and not required_pattern.search(value):
+            is_failed[i] = True
+            continue
+        try:
+            values[i] = mapper(value, None, None)
+        except HprcFieldValidationError:
+            is_failed[i] = True
+    return (values, is_failed)
 
-def check_non_applicable_slots(source_row_dict, row_index, model, schemaview):
+def get_last_column_positions(df):
+    """
+    Get a dict mapping the names of a dataframe's columns to the positions of the last columns with those names, ordered by the first columns with those names,
+    as the values of row dicts made from a dataframe with duplicate column names are.
+    """
+    positions = {}
+    for position, name in enumerate(df.columns):
+        positions[name] = position
+    return positions
+
+def cast_df(df, field_type_mappers, row_offset=0):
+    """
+    Cast the values of a dataframe to the types of the model fields, returning a dict mapping column names to arrays of cast values, and a dict of cast errors keyed by position.
+    As when rows are cast one field at a time, each row's error is for the first of its columns that can't be cast.
+    """
+    columns = {}
+    cast_errors = {}
+    for name, position in get_last_column_positions(df).items():
+        mapper = field_type_mappers.get(name)
+        values, is_failed = cast_column(df.iloc[:, position], mapper)
+        columns[name] = values
+        for i in np.flatnonzero(is_failed).tolist():
+            if i not in cast_errors:
+                cast_errors[i] = HprcFieldValidationError(PARSE_ERROR_MESSAGES[mapper], row_offset + i + 2, name)
+    return (columns, cast_errors)
+
+def get_cast_rows(columns, positions):
+    """
+    Get row dicts of the values cast by `cast_df` at the given positions.
+    """
+    names = list(columns.keys())
+    return [dict(zip(names, row_values)) for row_values in zip(*(values[positions].tolist() for values in columns.values()))] if names else [{} for _ in positions]
+
+@cache
+def get_non_model_slot_names(schemaview, model):
+    """
+    Get the names of the slots of a schema that aren't fields of the given model.
+    """
     model_field_names = get_pydantic_field_names(model)
-    non_applicable_slots = [name for name in schemaview.all_slots().keys() if name in source_row_dict and name not in model_field_names]
-    if non_applicable_slots:
-        raise HprcMultiFieldValidationError("Specified slot is in the broader model but not the specific class", row_index, non_applicable_slots)
+    return [name for name in schemaview.all_slots().keys() if name not in model_field_names]
 
-def validate_row(source_row_dict, row_index, field_type_mappers, model, schemaview):
-    errors = []
+def get_non_applicable_slots_by_position(df, model, schemaview):
+    """
+    Get a dict mapping the positions of rows that have values in columns for slots that are in the broader schema but not the model to the names of those slots.
+    The slots are determined once for the dataframe's columns; rows with empty values in those columns are unaffected. Of columns with the same name, the last is checked, as it's the one that rows are cast from.
+    """
+    slots_by_position = {}
+    column_positions = get_last_column_positions(df)
+    for name in get_non_model_slot_names(schemaview, model):
+        if name in column_positions:
+            column = df.iloc[:, column_positions[name]]
+            has_value = column.ne("").to_numpy(dtype=bool, na_value=False) & column.notna().to_numpy()
+            for i in np.flatnonzero(has_value).tolist():
+                slots_by_position.setdefault(i, []).append(name)
+    return slots_by_position
 
+@cache
+def get_rows_type_adapter(model):
+    return TypeAdapter(list[model])
+
+def validate_rows(rows, model):
+    """
+    Validate a list of row dicts against a model in a single call, returning a dict mapping the positions of invalid rows to their Pydantic errors,
+    with locations relative to the row.
+    """
     try:
-        check_non_applicable_slots(source_row_dict, row_index, model, schemaview)
-    except HprcMultiFieldValidationError as err:
-        errors += [HprcFieldValidationError(err.message, err.row, field) for field in err.fields]
-    
-    try:
-        row_dict = cast_row(source_row_dict, row_index, field_type_mappers)
-    except HprcFieldValidationError as err:
-        errors += [err]
-        row_dict = None
-    
-    if row_dict is not None:
-        try:
-            model.model_validate(row_dict)
-        except ValidationError as err:
-            errors += [HprcFieldValidationError(e["msg"], row_index, e["loc"][0]) for e in err.errors()]
-    
-    return errors or None
+        get_rows_type_adapter(model).validate_python(rows)
+    except ValidationError as err:
+        errors_by_position = {}
+        for e in err.errors(include_url=False):
+            errors_by_position.setdefault(e["loc"][0], []).append({**e, "loc": e["loc"][1:]})
+        return errors_by_position
+    return {}
+
+def get_row_errors(row_index, non_applicable_slots=(), cast_error=None, model_errors=()):
+    """
+    Get the errors of a row, given the non-applicable slots it has values for, and its cast error, if any, or else its Pydantic errors from `validate_rows`.
+    """
+    errors = [HprcFieldValidationError("Specified slot is in the broader model but not the specific class", row_index, name) for name in non_applicable_slots]
+    if cast_error is not None:
+        errors.append(cast_error)
+    else:
+        errors += [HprcFieldValidationError(e["msg"], row_index, e["loc"][0]) for e in model_errors]
+    return errors
 
-def validate_and_normalize_df(df, model, schemaview):
+def get_df_validation_errors(df, model, schemaview, row_offset=0):
     field_type_mappers = get_field_type_mappers(schemaview, model)
-    rows = df.to_dict(orient="records")
-    errors = [err for result in (validate_row(row, i + 2, field_type_mappers, model, schemaview) for i, row in enumerate(rows)) if result is not None for err in result]
+    non_applicable_slots = get_non_applicable_slots_by_position(df, model, schemaview)
+    cast_columns, cast_errors = cast_df(df, field_type_mappers, row_offset)
+    # Rows that couldn't be cast aren't validated against the model, and nor are rows that pass the checks compiled from the schema, which Pydantic would accept
+    is_cast = np.ones(len(df), dtype=bool)
+    is_cast[list(cast_errors.keys())] = False
+    validated_positions = np.flatnonzero(get_rows_to_validate(df, cast_columns, is_cast, schemaview, model))
+    model_errors = {
+        validated_positions[i].item(): row_errors
+        for i, row_errors in validate_rows(get_cast_rows(cast_columns, validated_positions), model).items()
+    }
+    return [
+        err for i in sorted(non_applicable_slots.keys() | cast_errors.keys() | model_errors.keys())
+        for err in get_row_errors(row_offset + i + 2, non_applicable_slots.get(i, ()), cast_errors.get(i), model_errors.get(i, ()))
+    ]
+
+@cache
+def get_validation_executor():
+    # Workers are spawned rather than forked, as validation is started from the threads that load specs
+    return ProcessPoolExecutor(VALIDATION_PROCESSES, mp_context=multiprocessing.get_context("spawn"))
+
+@cache
+def load_worker_schemaview(schema_path):
+    return SchemaView(schema_path)
+
+def get_df_validation_errors_in_worker(df, model, schema_path, row_offset):
+    """
+    Validate a chunk of rows in a validation worker process, which loads each schema once, and keeps the models' compiled checks and type adapters.
+    """
+    return get_df_validation_errors(df, model, load_worker_schemaview(schema_path), row_offset)
+
+def get_parallel_df_validation_errors(df, model, schemaview, row_offset=0):
+    """
+    Validate a dataframe in chunks of rows on the validation worker processes, if it's large enough and its schema was loaded from a file,
+    and otherwise in the calling thread. The chunks' errors are combined in row order, so that they're the same as if the whole dataframe was validated at once.
+    """
+    schema_path = schemaview.schema.source_file
+    chunk_size = max(VALIDATION_CHUNK_MIN_ROWS, -(-len(df) // max(VALIDATION_PROCESSES, 1)))
+    if VALIDATION_PROCESSES < 2 or len(df) <= chunk_size or schema_path is None:
+        return get_df_validation_errors(df, model, schemaview, row_offset)
+    executor = get_validation_executor()
+    futures = [
+        executor.submit(get_df_validation_errors_in_worker, df.iloc[start:start + chunk_size], model, os.path.abspath(schema_path), row_offset + start)
+        for start in range(0, len(df), chunk_size)
+    ]
+    return [err for future in futures for err in future.result()]
+
+def validate_and_normalize_df(df, model, schemaview, row_offset=0):
+    errors = get_parallel_df_validation_errors(df, model, schemaview, row_offset)
 
     model_fields = get_pydantic_field_names(model)
 
@@ -123,10 +341,114 @@ def validate_and_normalize_df(df, model, schemaview):
     
     return (df_with_schema_columns, errors)
 
+source_parse_stats = Counter()
+source_parse_stats_lock = threading.Lock()
+
+def record_source_parse(df, seconds, files=1):
+    memory = get_df_memory(df)
+    with source_parse_stats_lock:
+        source_parse_stats.update(files=files, rows=len(df), seconds=seconds, memory_bytes=memory)
+
+def take_source_parse_stats():
+    """
+    Print and get the totals for the source files parsed since the last call, for the run statistics of the build report, and reset them.
+    The seconds are summed across files, which may have been parsed concurrently, and the memory is that of the parsed dataframes;
+    these can be compared between builds with and without `ARROW_STRINGS`.
+    """
+    with source_parse_stats_lock:
+        stats = {
+            "arrow_strings": ARROW_STRINGS,
+            "files": source_parse_stats["files"],
+            "rows": source_parse_stats["rows"],
+            "seconds": round(source_parse_stats["seconds"], 3),
+            "memory_bytes": source_parse_stats["memory_bytes"],
+        }
+        source_parse_stats.clear()
+    print(f"Parsed {stats['files']} source files ({stats['rows']} rows) in {stats['seconds']} seconds, using {stats['memory_bytes']} bytes")
+    return stats
+
+def uses_arrow_strings(options):
+    # Only string reads without missing values are switched, as other reads would give different types or missing values
+    return ARROW_STRINGS and options.get("dtype") is str and options.get("keep_default_na") is False
+
+def parse_csv_with_pyarrow(path, sep):
+    """
+    Parse a CSV file with PyArrow, with every column read as strings without missing values, as the default engine does with `dtype=str` and `keep_default_na=False`,
+    or return `None` if the file's column names would be read differently.
+    """
+    if pa is None:
+        raise RuntimeError("`HPRC_ARROW_STRINGS` requires the `pyarrow` package")
+    # Read by Pandas, which renames blank and duplicated column names, so that such files can be left to the default engine
+    column_names = list(pd.read_csv(path, sep=sep, nrows=0).columns)
+    table = pa_csv.read_csv(
+        path,
+        parse_options=pa_csv.ParseOptions(delimiter=sep, newlines_in_values=True),
+        convert_options=pa_csv.ConvertOptions(column_types={name: pa.string() for name in column_names}, strings_can_be_null=False),
+    )
+    if table.column_names != column_names:
+        return None
+    return table.to_pandas(types_mapper={pa.string(): pd.StringDtype("pyarrow")}.get)
+
+def parse_csv(path, options):
+    if not uses_arrow_strings(options):
+        return pd.read_csv(path, **options)
+    options = {**options, "dtype": ARROW_STRING_DTYPE}
+    usecols = options.get("usecols")
+    if set(options) <= ARROW_ENGINE_READ_OPTIONS and (usecols is None or callable(usecols)):
+        try:
+            df = parse_csv_with_pyarrow(path, options.get("sep", ","))
+        except ValueError:
+            # Raised for malformed rows, which the default engine handles differently
+            df = None
+        if df is not None:
+            return df if usecols is None else df[[name for name in df.columns if usecols(name)]]
+    return pd.read_csv(path, **options)
+
+def read_source_csv(path, **options):
+    """
+    Parse a source file using `pd.read_csv`, recording the time taken and the size of the dataframe for `take_source_parse_stats`.
+    If `ARROW_STRINGS` is set, files read as strings without missing values are parsed by the PyArrow CSV reader into PyArrow-backed string columns,
+    with every column read as strings, so that no values are converted by type inference.
+    Where the PyArrow reader's behavior would differ (options it doesn't support, malformed rows, and blank or duplicated column names),
+    the default engine is used with the same dtype, so that the values are the same either way.
+    """
+    start_time = time.perf_counter()
+    df = parse_csv(path, options)
+    record_source_parse(df, time.perf_counter() - start_time)
+    return df
+
+def iter_source_csv_chunks(path, chunk_size, **options):
+    """
+    Parse a source file in chunks of up to `chunk_size` rows, as described for `read_source_csv`, except that the default engine is always used, as the PyArrow engine can't read in chunks.
+    """
+    if uses_arrow_strings(options):
+        options = {**options, "dtype": ARROW_STRING_DTYPE}
+    with pd.read_csv(path, **options, chunksize=chunk_size) as reader:
+        files = 1
+        while True:
+            start_time = time.perf_counter()
+            chunk = next(reader, None)
+            if chunk is None:
+                break
+            record_source_parse(chunk, time.perf_counter() - start_time, files)
+            files = 0
+            yield chunk
+
 def load_and_validate_csv(path, model, schemaview):
-    df = pd.read_csv(path, sep=",", usecols=lambda name: not name.startswith("Unnamed:"), dtype=str, keep_default_na=False)
+    df = read_source_csv(path, sep=",", usecols=lambda name: not name.startswith("Unnamed:"), dtype=str, keep_default_na=False)
     return validate_and_normalize_df(df, model, schemaview)
 
+def iter_validated_csv_chunks(path, model, schemaview, chunk_size):
+    """
+    Load and validate a CSV file in chunks of up to `chunk_size` rows, yielding a tuple of normalized dataframe and validation errors for each chunk.
+    """
+    row_offset = 0
+    for chunk in iter_source_csv_chunks(path, chunk_size, sep=",", usecols=lambda name: not name.startswith("Unnamed:"), dtype=str, keep_default_na=False):
+        yield validate_and_normalize_df(chunk, model, schemaview, row_offset)
+        row_offset += len(chunk)
+    if row_offset == 0:
+        yield load_and_validate_csv(path, model, schemaview)
+
 
 def format_index_list(ordered_indices):
     ranges = []
@@ -166,42 +488,83 @@ def format_errors_by_file(errors_by_file):
     return "\n\n".join(f"{filename}:\n{format_file_errors(errors)}" for filename, errors in errors_by_file.items())
 
 
-def download_file(url, output_folder_path, filename=None):
-    if filename is None:
-        filename = Path(urlparse(url).path).name
-    output_path = Path(output_folder_path, filename)
-    with requests.get(url) as r:
-        if r.status_code != 200:
-            raise RuntimeError(f"{url} caused error {r.status_code}. See details below:\n {r.text}")
-        print(f"Downloading:\n {url}\n to {output_path}")
-        with open(output_path.resolve(), "w") as f:
-            f.write(r.text)
-    return output_path
-
-def validation_input_formatter(model, schemaview, composed_formatter=None):
+def validation_input_formatter(model, schemaview, composed_formatter=None, retained_columns=()):
+    """
+    Make a contextual input formatter that validates and normalizes the loaded data, keeping any `retained_columns` that aren't in the model.
+    """
     def process_results(df, errors, context):
         return (df if composed_formatter is None else composed_formatter(df), (context["source_file_names"][0], errors))
-    return lambda df, meta, context: process_results(*validate_and_normalize_df(df, model, schemaview), context)
+    def format_input(df, meta, context):
+        normalized_df, errors = validate_and_normalize_df(df, model, schemaview, context.get("row_offset", 0))
+        return process_results(normalized_df.assign(**{name: df[name] for name in retained_columns}), errors, context)
+    return format_input
 
-"""
-`spec` may contain:
-sep -- Separator to use when reading delimited values file. Inherited by sub-specs in "source".
-read_options -- Parameters to pass to the Pandas `read_csv` function. Inherited by sub-specs in "source".
-url -- URL or list of URLs to get source file(s) from. Multiple source files will be concatenated.
-source -- Spec or list of specs to use as source data. Multiple sources will be concatenated. If a list, metadata is aggregated into a list. All-None metadata is converted to a single None value.
-source_transformer -- Function that receives a tuple of dataframe, metdata, and context, or a list of such tuples, and returns a value of the same form.
-map_spec -- Spec to apply to source dataframes individually.
-na -- Value to replace N/A values with after data is loaded.
-input_formatter -- Function to map loaded data.
-contextual_input_formatter -- Function to map loaded data, but is also passed metadata and contextual info. Should return a tuple of dataframe and metadata.
-mapper -- Function to map data after any non-spec processing done by `post_load_processor`.
-columns -- Mapping of column names, used to rename columns and to determine which columns to keep.
-Operations are applied in the order listed above.
-"""
-def load_dataframe_from_spec(spec, output_folder_path, post_load_processor=None, extra_columns_to_retain=[], parent_spec=None, preloaded_sources=None):
-    metadata = None
-    context = {"source_file_names": []}
+# Loaded source files for the current load, as futures of dataframe and file name keyed by URL, separator and read options
+url_source_memo = {}
+url_source_memo_hits = Counter()
+url_source_memo_lock = threading.Lock()
+# Downloaded source files for the current load, as futures of path and `DownloadInfo` keyed by URL
+url_download_memo = {}
+# Number of loads in progress that use the memos
+url_source_memo_users = 0
 
+@contextmanager
+def url_source_memo_scope():
+    """
+    Use the memos of loaded and downloaded source files for the duration of a load, clearing them once no load is using them,
+    so that the dataframes loaded by one build aren't kept in memory for the rest of the run.
+    """
+    global url_source_memo_users
+    with url_source_memo_lock:
+        url_source_memo_users += 1
+    try:
+        yield
+    finally:
+        with url_source_memo_lock:
+            url_source_memo_users -= 1
+            if url_source_memo_users == 0:
+                url_source_memo.clear()
+                url_source_memo_hits.clear()
+                url_download_memo.clear()
+
+def make_completed_future(value):
+    future = Future()
+    future.set_result(value)
+    return future
+
+def when_all(futures, fn):
+    """
+    Get a future of the result of calling `fn` with the results of the given futures, once they've all completed.
+    `fn` is called in the thread that completes the last of the futures, so that no worker is blocked waiting;
+    if it returns a future, the returned future resolves to that future's result.
+    """
+    result = Future()
+    remaining = len(futures)
+    lock = threading.Lock()
+    def copy_result(future):
+        if future.exception() is not None: result.set_exception(future.exception())
+        else: result.set_result(future.result())
+    def complete():
+        try:
+            value = fn([future.result() for future in futures])
+        except BaseException as ex:
+            result.set_exception(ex)
+            return
+        if isinstance(value, Future): value.add_done_callback(copy_result)
+        else: result.set_result(value)
+    def handle_done(_):
+        nonlocal remaining
+        with lock:
+            remaining -= 1
+            if remaining: return
+        complete()
+    if not futures:
+        complete()
+    for future in futures:
+        future.add_done_callback(handle_done)
+    return result
+
+def inherit_from_parent_spec(spec, parent_spec):
     if parent_spec is not None:
         # Inherit "sep"
         if "sep" in parent_spec:
@@ -209,124 +572,697 @@ def load_dataframe_from_spec(spec, output_folder_path, post_load_processor=None,
         # Inherit "read_options"
         if "read_options" in parent_spec:
             spec = {**spec, "read_options": {**parent_spec["read_options"], **spec.get("read_options", {})}}
+    return spec
+
+def download_url_source(url, output_folder_path):
+    """
+    Download a source file, or, if it has already been downloaded in this load, get the path and `DownloadInfo` of the download.
+    """
+    with url_source_memo_lock:
+        memo_future = url_download_memo.get(url)
+        is_hit = memo_future is not None
+        if not is_hit:
+            memo_future = url_download_memo[url] = Future()
+    if not is_hit:
+        try:
+            memo_future.set_result(download_file_with_info(url, output_folder_path))
+        except BaseException as ex:
+            memo_future.set_exception(ex)
+    return memo_future.result()
+
+def load_url_source(spec, url, output_folder_path, profile=None):
+    """
+    Download and parse a source file, or, if the same URL has already been loaded with the same options in this load, reuse the loaded dataframe.
+    Dataframes are handed out as shallow copies, which must not be modified in place.
+    """
+    key = (url, spec["sep"], json.dumps(spec.get("read_options", {}), sort_keys=True, default=repr))
+    with url_source_memo_lock:
+        memo_future = url_source_memo.get(key)
+        is_hit = memo_future is not None
+        if is_hit:
+            url_source_memo_hits[key] += 1
+            print(f"Reusing loaded source (hit {url_source_memo_hits[key]}):\n {url}")
+        else:
+            memo_future = url_source_memo[key] = Future()
+    if not is_hit:
+        try:
+            path, info = run_profiled_step(profile, "download", lambda: download_url_source(url, output_folder_path), get_df_out=lambda _: None)
+            # Compressed files are decompressed by Pandas as they're parsed, based on their extension
+            df = run_profiled_step(profile, "read_csv", lambda: read_source_csv(path, **spec.get("read_options", {}), sep=spec["sep"]))
+            memo_future.set_result((df, info.filename))
+        except BaseException as ex:
+            memo_future.set_exception(ex)
+    df, filename = run_profiled_step(profile, "reuse loaded source", memo_future.result, get_df_out=lambda result: result[0]) if is_hit else memo_future.result()
+    return (df.copy(deep=False), None, {"source_file_names": [filename]})
+
+def format_loaded_sources(spec, loaded_sources, source_is_singular, profile=None):
+    context = {"source_file_names": []}
+    source_dfs, metadata, sub_contexts = [list(items) for items in zip(*loaded_sources)]
+    df = run_profiled_step(profile, "concat", lambda: pd.concat(source_dfs))
+    if source_is_singular: metadata = metadata[0]
+    elif all(m is None for m in metadata): metadata = None
+    context["source_file_names"] += [name for context in sub_contexts for name in context["source_file_names"]]
+    if len(sub_contexts) == 1 and "row_offset" in sub_contexts[0]:
+        context["row_offset"] = sub_contexts[0]["row_offset"]
 
+    if "na" in spec:
+        df = run_profiled_step(profile, "na", lambda: df.fillna(spec["na"]), df)
+    if "input_formatter" in spec:
+        df = run_profiled_step(profile, "input_formatter", lambda: spec["input_formatter"](df), df)
+    if "contextual_input_formatter" in spec:
+        df, metadata = run_profiled_step(
+            profile, "contextual_input_formatter", lambda: spec["contextual_input_formatter"](df, metadata, context), df, lambda result: result[0]
+        )
+    return (df, metadata, context)
+
+def finish_df_from_spec(spec, df, post_load_processor=None, extra_columns_to_retain=[], profile=None):
+    if post_load_processor is not None:
+        df = run_profiled_step(profile, "post_load_processor", lambda: post_load_processor(df), df)
+
+    if "mapper" in spec:
+        df = run_profiled_step(profile, "mapper", lambda: spec["mapper"](df), df)
+    if "columns" in spec:
+        df = run_profiled_step(profile, "columns", lambda: df[[*spec["columns"].keys(), *extra_columns_to_retain]].rename(columns=spec["columns"]), df)
+    return df
+
+def submit_spec(spec, output_folder_path, executor, parent_spec=None, preloaded_sources=None, profile=None):
+    """
+    Submit the loading of a spec to the executor as a dependency graph, in which each URL is downloaded and parsed as a separate task,
+    and the processing of each spec is done once the specs and URLs it's sourced from are loaded.
+    Returns a future of a tuple of dataframe, metadata and context, which are as returned by `load_dataframe_from_spec`, except that `post_load_processor`, `mapper` and `columns` aren't applied to the root spec.
+    If a `SpecProfile` is given, the steps of loading the spec are recorded in it, with a child profile for each source.
+    """
+    spec = inherit_from_parent_spec(spec, parent_spec)
+    add_child_profile = lambda name: None if profile is None else profile.add_child(name)
+
+    if spec.get("materialize") and SPEC_MATERIALIZE and preloaded_sources is None:
+        return submit_materialized_spec(spec, output_folder_path, executor, profile)
     if preloaded_sources is not None:
         source_is_singular = isinstance(preloaded_sources, tuple)
-        loaded_sources = [preloaded_sources] if source_is_singular else preloaded_sources
+        loaded_source_futures = [make_completed_future(source) for source in ([preloaded_sources] if source_is_singular else preloaded_sources)]
     elif "url" in spec: # Get source dataframe from URL(s)
         if "sep" not in spec:
             raise Exception("Separator not specified for delimited values file URL")
-        sep = spec["sep"]
         source_is_singular = isinstance(spec["url"], str)
         urls = [spec["url"]] if source_is_singular else spec["url"]
-        paths = [download_file(url, output_folder_path) for url in urls]
-        loaded_sources = [(pd.read_csv(path, **spec.get("read_options", {}), sep=sep), None, {"source_file_names": [path.name]}) for path in paths]
+        loaded_source_futures = [executor.submit(load_url_source, spec, url, output_folder_path, add_child_profile(f"url {url}")) for url in urls]
     elif "source" in spec: # Get source dataframe from spec(s)
         source_is_singular = isinstance(spec["source"], dict)
         sources = [spec["source"]] if source_is_singular else spec["source"]
-        loaded_sources = [load_dataframe_from_spec(source, output_folder_path, parent_spec=spec) for source in sources]
+        loaded_source_futures = [
+            load_sub_spec(source, output_folder_path, executor, spec, profile=add_child_profile(f"source {index}"))
+            for index, source in enumerate(sources)
+        ]
     else:
         raise Exception("No dataframe source specified")
-    
-    if "source_transformer" in spec:
-        loaded_sources = spec["source_transformer"](loaded_sources[0] if source_is_singular else loaded_sources)
-        source_is_singular = isinstance(loaded_sources, tuple)
-        if source_is_singular: loaded_sources = [loaded_sources]
-    
-    if "map_spec" in spec:
-        loaded_sources = [
-            load_dataframe_from_spec(spec["map_spec"], output_folder_path, parent_spec=spec, preloaded_sources=source)
-            for source in loaded_sources
+
+    def transform_sources(loaded_sources):
+        is_singular = source_is_singular
+        if "source_transformer" in spec:
+            loaded_sources = run_profiled_step(
+                profile, "source_transformer", lambda: spec["source_transformer"](loaded_sources[0] if is_singular else loaded_sources), get_df_out=lambda _: None
+            )
+            is_singular = isinstance(loaded_sources, tuple)
+            if is_singular: loaded_sources = [loaded_sources]
+        if "map_spec" not in spec:
+            return format_loaded_sources(spec, loaded_sources, is_singular, profile)
+        mapped_source_futures = [
+            load_sub_spec(spec["map_spec"], output_folder_path, executor, spec, preloaded_sources=source, profile=add_child_profile(f"map_spec {index}"))
+            for index, source in enumerate(loaded_sources)
         ]
+        return when_all(mapped_source_futures, lambda mapped_sources: executor.submit(format_loaded_sources, spec, mapped_sources, is_singular, profile))
 
-    source_dfs, metadata, sub_contexts = [list(items) for items in zip(*loaded_sources)]
-    df = pd.concat(source_dfs)
-    if source_is_singular: metadata = metadata[0]
-    elif all(m is None for m in metadata): metadata = None
-    context["source_file_names"] += [name for context in sub_contexts for name in context["source_file_names"]]
+    return when_all(loaded_source_futures, transform_sources)
 
-    if "na" in spec:
-        df = df.fillna(spec["na"])
-    if "input_formatter" in spec:
-        df = spec["input_formatter"](df)
-    if "contextual_input_formatter" in spec:
-        df, metadata = spec["contextual_input_formatter"](df, metadata, context)
-    
-    if post_load_processor is not None:
-        df = post_load_processor(df)
+def submit_materialized_spec(spec, output_folder_path, executor, profile=None):
+    """
+    Submit the loading of a spec, as done by `submit_spec`, reusing its output from a previous build if its fingerprint is unchanged, and otherwise saving the output.
+    The fingerprint is computed once the spec's source files have been downloaded (or found to be unmodified), from their digests and from the spec itself.
+    """
+    unmaterialized_spec = {name: value for name, value in spec.items() if name != "materialize"}
+    download_futures = [executor.submit(download_url_source, url, output_folder_path) for url in get_spec_urls(spec)]
+    def load(downloads):
+        fingerprint = run_profiled_step(
+            profile, "fingerprint", lambda: get_spec_fingerprint(unmaterialized_spec, [info.sha256 for _, info in downloads], {"arrow_strings": ARROW_STRINGS}), get_df_out=lambda _: None
+        )
+        if fingerprint is None:
+            return submit_spec(unmaterialized_spec, output_folder_path, executor, profile=profile)
+        materialized = run_profiled_step(profile, "load materialized output", lambda: load_materialized_output(fingerprint), get_df_out=lambda result: result and result[0])
+        if materialized is not None:
+            print(f"Using materialized spec output {fingerprint}")
+            return materialized
+        def save(results):
+            run_profiled_step(profile, "save materialized output", lambda: save_materialized_output(fingerprint, results[0]), get_df_out=lambda _: None)
+            print(f"Materialized spec output {fingerprint}")
+            return results[0]
+        return when_all([submit_spec(unmaterialized_spec, output_folder_path, executor, profile=profile)], save)
+    return when_all(download_futures, load)
 
-    if "mapper" in spec:
-        df = spec["mapper"](df)
+def load_sub_spec(spec, output_folder_path, executor, parent_spec, preloaded_sources=None, profile=None):
+    def finish(results):
+        df, metadata, context = results[0]
+        return (finish_df_from_spec(spec, df, profile=profile), metadata, context)
+    return when_all([submit_spec(spec, output_folder_path, executor, parent_spec, preloaded_sources, profile)], finish)
+
+def format_spec_plan(spec, name="spec", indent=0, parent_spec=None):
+    """
+    Describe the sources and steps of a spec as an indented tree, without loading anything.
+    """
+    spec = inherit_from_parent_spec(spec, parent_spec)
+    lines = [f"{'  ' * indent}{name}"]
+    if "url" in spec:
+        urls = [spec["url"]] if isinstance(spec["url"], str) else spec["url"]
+        lines += [f"{'  ' * (indent + 1)}url {url} (sep {spec.get('sep')!r})" for url in urls]
+    if "source" in spec:
+        sources = [spec["source"]] if isinstance(spec["source"], dict) else spec["source"]
+        lines += [format_spec_plan(source, f"source {index}", indent + 1, spec) for index, source in enumerate(sources)]
+    if "source_transformer" in spec:
+        lines.append(f"{'  ' * (indent + 1)}source_transformer")
+    if "map_spec" in spec:
+        lines.append(format_spec_plan(spec["map_spec"], "map_spec (for each source)", indent + 1, spec))
+    lines += [f"{'  ' * (indent + 1)}{key}" for key in ("na", "input_formatter", "contextual_input_formatter", "mapper") if key in spec]
     if "columns" in spec:
-        df = df[[*spec["columns"].keys(), *extra_columns_to_retain]].rename(columns=spec["columns"])
-    
+        lines.append(f"{'  ' * (indent + 1)}columns {', '.join(spec['columns'].values())}")
+    return "\n".join(lines)
+
+def get_spec_urls(spec):
+    urls = [] if "url" not in spec else [spec["url"]] if isinstance(spec["url"], str) else list(spec["url"])
+    if "source" in spec:
+        urls += [url for source in ([spec["source"]] if isinstance(spec["source"], dict) else spec["source"]) for url in get_spec_urls(source)]
+    return urls
+
+def print_releases_plan(releases_info):
+    """
+    Print the specs that `load_data_for_releases` would load, and the number of source files it would download.
+    """
+    specs = [(f"{key} (release {info['release']})", spec) for info in releases_info for key, spec in info.items() if key != "release"]
+    for name, spec in specs:
+        print(format_spec_plan(spec, name))
+    print(f"\n{len({url for _, spec in specs for url in get_spec_urls(spec)})} source files to download")
+
+def print_file_size_request_estimate(entity_type_name, output_path, uri_column, manifest_path=None):
+    """
+    Print the number of file size requests that a build would be expected to make, based on the files in the previous build's output,
+    less those whose sizes would be found in the manifest or in the file size cache without revalidation.
+    """
+    if not os.path.exists(output_path):
+        print(f"Expected {entity_type_name} file size requests unknown, as there's no previous build")
+        return
+    uris = pd.read_csv(output_path, usecols=[uri_column], dtype=str, keep_default_na=False)[uri_column].drop_duplicates()
+    urls_by_uri = {uri: get_file_size_url(uri) for uri in uris}
+    if manifest_path is None:
+        manifest_path = FILE_SIZE_MANIFEST_PATH
+    manifest_uris = set() if manifest_path is None else set(get_file_sizes_from_manifest(urls_by_uri.keys(), load_file_size_manifest(manifest_path)))
+    with FileSizeCache(read_only=True) as cache:
+        cached_entries = cache.get_many(url for uri, url in urls_by_uri.items() if uri not in manifest_uris)
+        request_count = sum(
+            1 for uri, url in urls_by_uri.items()
+            if uri not in manifest_uris and (url not in cached_entries or not (OFFLINE or cache.is_usable(cached_entries[url])))
+        )
+    print(f"Expected {0 if OFFLINE else request_count} {entity_type_name} file size requests (of {len(urls_by_uri)} files in the previous build)")
+
+"""
+`spec` may contain:
+sep -- Separator to use when reading delimited values file. Inherited by sub-specs in "source".
+read_options -- Parameters to pass to the Pandas `read_csv` function. Inherited by sub-specs in "source".
+url -- URL or list of URLs to get source file(s) from. Multiple source files will be concatenated.
+source -- Spec or list of specs to use as source data. Multiple sources will be concatenated. If a list, metadata is aggregated into a list. All-None metadata is converted to a single None value.
+source_transformer -- Function that receives a tuple of dataframe, metdata, and context, or a list of such tuples, and returns a value of the same form.
+map_spec -- Spec to apply to source dataframes individually.
+na -- Value to replace N/A values with after data is loaded.
+input_formatter -- Function to map loaded data.
+contextual_input_formatter -- Function to map loaded data, but is also passed metadata and contextual info. Should return a tuple of dataframe and metadata.
+mapper -- Function to map data after any non-spec processing done by `post_load_processor`.
+columns -- Mapping of column names, used to rename columns and to determine which columns to keep.
+materialize -- Whether to save the output of the spec, before `mapper` and `columns`, and reuse it in later builds while the spec and its source files are unchanged.
+Operations are applied in the order listed above.
+Independent sources are loaded concurrently, using up to `SPEC_JOBS` threads.
+If `SPEC_PROFILE` is set, the time and dataframe sizes of each step are printed as a tree and saved to `SPEC_PROFILES_FOLDER_PATH` under `profile_name`.
+"""
+def load_dataframe_from_spec(spec, output_folder_path, post_load_processor=None, extra_columns_to_retain=[], parent_spec=None, preloaded_sources=None, profile_name="spec"):
+    profile = SpecProfile(profile_name) if SPEC_PROFILE else None
+    with url_source_memo_scope(), ThreadPoolExecutor(max_workers=SPEC_JOBS) as executor:
+        df, metadata, context = submit_spec(spec, output_folder_path, executor, parent_spec, preloaded_sources, profile).result()
+    df = finish_df_from_spec(spec, df, post_load_processor, extra_columns_to_retain, profile)
+    if profile is not None:
+        save_spec_profile(profile, SPEC_PROFILES_FOLDER_PATH)
     return (df, metadata, context)
 
-def append_df_for_release(base_df, release_df, release):
-    release_df = release_df.copy()
-    release_df["release"] = release
-    return release_df if base_df is None else pd.concat([base_df, release_df], ignore_index=True).fillna("N/A")
+def to_arrow_strings(df):
+    """
+    Convert the object columns of a dataframe that only contain strings to PyArrow-backed string columns.
+    """
+    string_columns = [name for name, dtype in df.dtypes.items() if dtype == object and pd.api.types.infer_dtype(df[name], skipna=False) == "string"]
+    return df.astype({name: ARROW_STRING_DTYPE for name in string_columns}) if string_columns else df
 
-def load_data_for_releases(releases_info, output_folder_path):
-    dfs = {}
+def concat_releases(release_dfs):
+    """
+    Concatenate the data of releases, filling values that are missing, including those of columns that are missing from some releases, with "N/A".
+    """
+    if len(release_dfs) == 1:
+        df = release_dfs[0]
+    else:
+        df = pd.concat(release_dfs, ignore_index=True)
+        # Only columns with missing values, which include those that are missing from some releases, are filled
+        shared_columns = set.intersection(*(set(release_df.columns) for release_df in release_dfs))
+        df = df.fillna({name: "N/A" for name in df.columns if name not in shared_columns or df[name].hasnans})
+    # Keep the combined string columns in PyArrow-backed storage, including any that were converted to objects by being missing from some releases
+    return to_arrow_strings(df) if ARROW_STRINGS else df
+
+def load_data_for_releases(releases_info, output_folder_path, profile_name="releases"):
+    """
+    Load the data for each release, concurrently, then combine each type of data across releases, in order, with the release stored as a categorical `release` column.
+    Each release's data is concatenated once, unless a later release's spec has a `mapper` or `columns`, which also apply to the data of earlier releases.
+    If `SPEC_PROFILE` is set, the steps of loading each release's specs are profiled under `profile_name`.
+    """
+    releases = [info["release"] for info in releases_info]
+    release_dfs = {}
     metadata = {}
-    for info in releases_info:
-        dfs_info = {**info}
-        release = dfs_info.pop("release")
-        for key, spec in dfs_info.items():
-            prev_df = dfs.get(key)
+    profile = SpecProfile(profile_name) if SPEC_PROFILE else None
+    with url_source_memo_scope(), ThreadPoolExecutor(max_workers=SPEC_JOBS) as executor:
+        release_futures = []
+        for info in releases_info:
+            for key, spec in info.items():
+                if key == "release": continue
+                spec_profile = None if profile is None else profile.add_child(f"{key} (release {info['release']})")
+                release_futures.append((info["release"], key, spec, spec_profile, submit_spec(spec, output_folder_path, executor, profile=spec_profile)))
+        for release, key, spec, spec_profile, future in release_futures:
+            release_df, release_metadata, _ = future.result()
             if key not in metadata: metadata[key] = {}
-            dfs[key], metadata[key][release] = load_dataframe_from_spec(
-                spec,
-                output_folder_path,
-                lambda df: append_df_for_release(prev_df, df, release),
-                ["release"]
-            )[:2]
+            key_release_dfs = release_dfs.setdefault(key, [])
+            key_release_dfs.append(release_df.assign(release=pd.Categorical([release] * len(release_df), categories=releases)))
+            if "mapper" in spec or "columns" in spec:
+                # Combine the releases so far, so that the spec's `mapper` and `columns` also apply to the data of earlier releases
+                combined_df = run_profiled_step(spec_profile, "concat releases", lambda: concat_releases(key_release_dfs), release_df)
+                key_release_dfs[:] = [finish_df_from_spec(spec, combined_df, extra_columns_to_retain=["release"], profile=spec_profile)]
+            metadata[key][release] = release_metadata
+    dfs = {key: run_profiled_step(profile, f"concat releases {key}", lambda: concat_releases(key_release_dfs)) for key, key_release_dfs in release_dfs.items()}
+    if profile is not None:
+        save_spec_profile(profile, SPEC_PROFILES_FOLDER_PATH)
     # For compatibility, only return metadata if it's all non-None
     return dfs if all(m is None for type_metadata in metadata.values() for m in type_metadata.values()) else (dfs, metadata)
 
+def iter_url_source_chunks(spec, url, output_folder_path, chunk_size):
+    """
+    Load a source file in chunks of up to `chunk_size` rows.
+    The file is read as strings unless the spec's "read_options" specify a dtype, as the types of the columns would otherwise be inferred separately for each chunk.
+    """
+    path, info = download_file_with_info(url, output_folder_path)
+    read_options = {"dtype": str, **spec.get("read_options", {})}
+    row_offset = 0
+    for chunk in iter_source_csv_chunks(path, chunk_size, **read_options, sep=spec["sep"]):
+        yield (chunk, None, {"source_file_names": [info.filename], "row_offset": row_offset})
+        row_offset += len(chunk)
+    if row_offset == 0:
+        # Keep the columns of empty files
+        yield (read_source_csv(path, **read_options, sep=spec["sep"], nrows=0), None, {"source_file_names": [info.filename], "row_offset": 0})
+
+def iter_formatted_spec_chunks(spec, output_folder_path, chunk_size, parent_spec=None):
+    """
+    Load a spec in chunks of up to `chunk_size` rows of a single source file each, yielding a tuple of dataframe, metadata and context for each chunk,
+    as they would be returned by `submit_spec` for the chunk's rows alone.
+    The steps of the spec are applied to each chunk, so they must only depend on the rows in the chunk;
+    specs with a `source_transformer` or `map_spec`, or with `"chunkable": False`, are loaded whole and yielded as a single chunk.
+    The context of each chunk includes `row_offset`, the number of rows of its source file that precede it, which validation adds to row numbers.
+    """
+    spec = inherit_from_parent_spec(spec, parent_spec)
+    if "source_transformer" in spec or "map_spec" in spec or not spec.get("chunkable", True):
+        with url_source_memo_scope(), ThreadPoolExecutor(max_workers=SPEC_JOBS) as executor:
+            yield submit_spec(spec, output_folder_path, executor).result()
+        return
+    if "url" in spec:
+        if "sep" not in spec:
+            raise Exception("Separator not specified for delimited values file URL")
+        source_is_singular = isinstance(spec["url"], str)
+        urls = [spec["url"]] if source_is_singular else spec["url"]
+        source_chunks = (chunk for url in urls for chunk in iter_url_source_chunks(spec, url, output_folder_path, chunk_size))
+    elif "source" in spec:
+        source_is_singular = isinstance(spec["source"], dict)
+        sources = [spec["source"]] if source_is_singular else spec["source"]
+        source_chunks = (
+            (finish_df_from_spec(inherit_from_parent_spec(source, spec), df), metadata, context)
+            for source in sources
+            for df, metadata, context in iter_formatted_spec_chunks(source, output_folder_path, chunk_size, spec)
+        )
+    else:
+        raise Exception("No dataframe source specified")
+    for source_chunk in source_chunks:
+        yield format_loaded_sources(spec, [source_chunk], source_is_singular)
+
+def iter_release_chunks(releases_info, key, output_folder_path, chunk_size):
+    """
+    Load one type of data for each release in chunks, as described for `iter_formatted_spec_chunks`, yielding tuples of dataframe, metadata and release.
+    Each chunk is processed as by `load_data_for_releases`, except that the union of columns across chunks isn't taken (see `write_chunks_to_csv`).
+    As the `mapper` and `columns` of a release's spec would also apply to the data of earlier releases, they may only be given for the first release.
+    """
+    releases = [(info["release"], info[key]) for info in releases_info if key in info]
+    for release, spec in releases[1:]:
+        if "mapper" in spec or "columns" in spec:
+            raise ValueError(f"Release {release} {key} spec has `mapper` or `columns`, which can't be applied to earlier releases when loading in chunks")
+    for release, spec in releases:
+        for df, metadata, _ in iter_formatted_spec_chunks(spec, output_folder_path, chunk_size):
+            df = finish_df_from_spec(spec, df, lambda df: df.assign(release=release), ["release"])
+            # Values are filled once data from multiple releases is accumulated
+            yield (df.fillna("N/A") if len(releases) > 1 else df, metadata, release)
 
-def get_file_size(uri, total_files, current_index, entity_type_name, handle_error=None):
+def write_chunks_to_csv(chunks, output_path, process_chunk=None, fill_value="", sort_columns=False):
     """
-    Convert S3 URI to HTTPS if necessary and fetch file size using HEAD request.
-    Show progress by printing remaining files to process.
+    Write dataframe chunks to a CSV file with the union of their columns, in order of first appearance or sorted, using memory proportional to the size of a chunk.
+    The chunks are first written to temporary part files, so that all of the columns are known, and then each part is read back as strings,
+    given any missing columns with `fill_value`, passed through `process_chunk` if given, and appended to the output.
     """
-    size = "N/A"
-    error_message = None
+    os.makedirs(CHUNK_PARTS_FOLDER_PATH, exist_ok=True)
+    with tempfile.TemporaryDirectory(dir=CHUNK_PARTS_FOLDER_PATH) as parts_folder_path:
+        part_paths = []
+        columns = {}
+        for chunk in chunks:
+            part_paths.append(os.path.join(parts_folder_path, f"part-{len(part_paths)}.csv"))
+            chunk.to_csv(part_paths[-1], index=False)
+            columns.update(dict.fromkeys(chunk.columns))
+        columns = sorted(columns) if sort_columns else list(columns)
+        partial_output_path = os.path.join(parts_folder_path, "output.csv")
+        for index, part_path in enumerate(part_paths):
+            df = pd.read_csv(part_path, dtype=str, keep_default_na=False).reindex(columns=columns, fill_value=fill_value)
+            if process_chunk is not None:
+                df = process_chunk(df)
+            df.to_csv(partial_output_path, mode="w" if index == 0 else "a", header=index == 0, index=False)
+            os.remove(part_path)
+        if part_paths:
+            os.replace(partial_output_path, output_path)
+
+def get_file_size_url(uri):
+    """
+    Convert S3 or Google Cloud Storage URI to HTTPS if necessary.
+    """
+    if uri.startswith("s3://"):
+        return get_s3_object_url(uri)
+    if uri.startswith("gs://"):
+        return f"https://storage.googleapis.com/{uri[5:]}"
+    return uri
+
+@dataclass
+class FileSizeResult:
+    size: int | str
+    error_message: str | None = None
+    etag: str | None = None
+    last_modified: str | None = None
+
+@dataclass
+class FileSizeRequestState:
+    """
+    State shared by the calls of `get_file_sizes_from_uris` made by a build that fetches file sizes in several batches, as chunked builds do:
+    the sizes reused from the previous build, which are loaded once, and the per-host rate controller and latency tracker, so that request rates carry over between batches.
+    """
+    previous_sizes: dict | None = None
+    rate_controller: HostRateController | None = None
+    latency_tracker: LatencyTracker = field(default_factory=LatencyTracker)
+
+def get_file_size(url, session=None, cached=None):
+    """
+    Fetch file size using HEAD request.
+    If a cached entry is given, the request is made conditional on the file being unchanged, and the cached size is used if it is.
+    """
+    if session is None:
+        session = get_default_session()
+    headers = {}
+    if cached is not None:
+        if cached.etag is not None: headers["If-None-Match"] = cached.etag
+        if cached.last_modified is not None: headers["If-Modified-Since"] = cached.last_modified
     try:
-        # Convert S3 to HTTPS URL
-        if uri.startswith("s3://"):
-            bucket, *key_parts = uri[5:].split("/")  # Remove `s3://` and split to extract bucket and key
-            # Ensure that characters such as `+`, which may not already be URL-encoded, are encoded properly
-            key_parts = [url_quote(url_unquote(part), safe="") for part in key_parts]
-            uri = f"https://{bucket}.s3.amazonaws.com/{"/".join(key_parts)}"
-
-        # Make HEAD request to get file size
-        response = requests.head(uri, timeout=10)
-        if response.status_code == 200:
-            if "Content-Length" in response.headers:
-                size = int(response.headers["Content-Length"])
+        response = session.head(url, timeout=10, headers=headers)
+        if response.status_code == 304 and cached is not None:
+            return FileSizeResult(cached.size, etag=cached.etag, last_modified=cached.last_modified)
+        if response.status_code != 200:
+            return FileSizeResult("N/A", f"Received {response.status_code} response")
+        if "Content-Length" not in response.headers:
+            return FileSizeResult("N/A", f"No `Content-Length` header received")
+        return FileSizeResult(int(response.headers["Content-Length"]), etag=response.headers.get("ETag"), last_modified=response.headers.get("Last-Modified"))
+    except Exception as ex:
+        return FileSizeResult("N/A", str(ex))
+
+def get_file_size_with_retries(url, session=None, cached=None, retries=0):
+    """
+    Fetch file size using HEAD request, retrying failed requests up to `retries` times with exponential backoff and full jitter.
+    """
+    for attempt in range(retries + 1):
+        if attempt > 0:
+            time.sleep(random.uniform(0, min(FILE_SIZE_RETRY_MAX_DELAY, FILE_SIZE_RETRY_BASE_DELAY * 2 ** (attempt - 1))))
+        result = get_file_size(url, session, cached)
+        if result.error_message is None:
+            break
+    return result
+
+def get_hedged_file_size(url, mirror_url, cached, get_result, hedge_executor, latency_tracker, mismatches):
+    """
+    Fetch file size from the given URL using the `get_result` function, also requesting it from the mirror URL if the first request fails or is slower than the latency tracker's hedge delay.
+    Returns a tuple of the result and whether it came from the mirror; if both requests succeed with different sizes, an error message is added to `mismatches`.
+    """
+    def cross_check(primary_result, mirror_result):
+        if primary_result.size != mirror_result.size:
+            mismatches[url] = f"Size {primary_result.size} differs from size {mirror_result.size} of mirror {mirror_url}"
+    result, from_mirror = hedge(
+        lambda: get_result(url, cached),
+        lambda: get_result(mirror_url, None),
+        hedge_executor,
+        latency_tracker.get_hedge_delay(),
+        lambda result: result.error_message is None,
+        cross_check
+    )
+    # Validators from the mirror don't apply to the primary URL
+    return (replace(result, etag=None, last_modified=None) if from_mirror else result, from_mirror)
+
+def load_previous_file_sizes(output_path, report_path, uri_column):
+    """
+    Get the file sizes from a previous build's output CSV, excluding files listed as having errors in its report.
+    Returns a dict mapping URLs to results.
+    """
+    with open(report_path) as f:
+        failed_urls = {error["uri"] for error in json.load(f)["file_uri_errors"] or []}
+    previous_df = pd.read_csv(output_path, usecols=[uri_column, "file_size"], dtype=str, keep_default_na=False)
+    previous_sizes = {}
+    for uri, size in zip(previous_df[uri_column], previous_df["file_size"]):
+        url = get_file_size_url(uri)
+        if url not in failed_urls and size.isdigit():
+            previous_sizes[url] = FileSizeResult(int(size))
+    return previous_sizes
+
+def get_file_sizes_from_s3_listings(uris, session, executor):
+    """
+    Get the sizes of the files at the given S3 URIs by listing the common prefixes of the files in each directory.
+    Directories containing only one of the URIs, and URIs that are not found in the listings, are left out of the results, to be requested individually.
+    Returns a dict mapping URLs to results.
+    """
+    groups = [group for group in group_s3_uris_by_prefix(uris) if len(group[2]) > 1]
+    futures = {executor.submit(list_s3_objects, session, bucket, prefix): uris_by_key for bucket, prefix, uris_by_key in groups}
+    results = {}
+    for completed_count, future in enumerate(as_completed(futures)):
+        try:
+            listed_objects = future.result()
+        except Exception as ex:
+            print(f"An error occurred while listing S3 objects: {ex}")
+            continue
+        for key, uri in futures[future].items():
+            if key in listed_objects:
+                size, etag, last_modified = listed_objects[key]
+                results[get_file_size_url(uri)] = FileSizeResult(size, etag=etag, last_modified=last_modified)
+        print(f"Remaining S3 prefixes to list: {len(groups) - completed_count - 1}")
+    return results
+
+def request_file_sizes(urls_to_request, entity_type_name, jobs, stats=None, retries=0, mirror_urls=None, request_state=None):
+    """
+    Request the sizes of files given as a list of tuples of URL, source URI, and the cached entry to revalidate (or None).
+    If `FILE_SIZE_SOURCE` is "listing", sizes of S3 files are fetched from bucket listings where possible, and HEAD requests are used for the remainder.
+    Requests are scheduled per host by a `HostRateController`, and if a `stats` dict is given, the resulting request rates are added to it.
+    Failed HEAD requests are retried up to `retries` times.
+    HEAD requests for URLs in `mirror_urls` are hedged by requesting the mirror URL if the primary is slow or fails.
+    If a `FileSizeRequestState` is given, its rate controller and latency tracker are used, and kept for later requests.
+    Returns a dict mapping URLs to results.
+    """
+    if mirror_urls is None:
+        mirror_urls = {}
+    if request_state is None:
+        request_state = FileSizeRequestState()
+    if request_state.rate_controller is None:
+        request_state.rate_controller = HostRateController(jobs)
+    results = {}
+    rate_controller = request_state.rate_controller
+    latency_tracker = request_state.latency_tracker
+    mismatches = {}
+    mirror_results_count = 0
+    def get_tracked_file_size(url, cached):
+        start_time = time.time()
+        result = get_file_size_with_retries(url, session, cached, retries)
+        latency_tracker.record(time.time() - start_time)
+        return result
+    with (
+        make_session(jobs) as http_session,
+        ThreadPoolExecutor(max_workers=jobs) as executor,
+        ThreadPoolExecutor(max_workers=jobs * 2) as hedge_executor
+    ):
+        session = RateControlledSession(http_session, rate_controller)
+        if FILE_SIZE_SOURCE == "listing":
+            results.update(get_file_sizes_from_s3_listings([uri for _, uri, _ in urls_to_request if uri.startswith("s3://")], session, executor))
+        urls_to_head = [(url, cached) for url, _, cached in urls_to_request if url not in results]
+        futures = {
+            (
+                executor.submit(get_hedged_file_size, url, mirror_urls[url], cached, get_tracked_file_size, hedge_executor, latency_tracker, mismatches)
+                if url in mirror_urls else
+                executor.submit(lambda url, cached: (get_tracked_file_size(url, cached), False), url, cached)
+            ): url
+            for url, cached in urls_to_head
+        }
+        for completed_count, future in enumerate(as_completed(futures)):
+            url = futures[future]
+            results[url], from_mirror = future.result()
+            mirror_results_count += from_mirror
+            # Update progress
+            print(f"Remaining {entity_type_name} files to process: {len(urls_to_head) - completed_count - 1}")
+            error_message = results[url].error_message
+            if error_message is not None:
+                print(f"An error occurred while requesting {url}: {error_message}")
+    for url, message in mismatches.items():
+        print(f"Mirror size mismatch for {url}: {message}")
+        results[url] = replace(results[url], error_message=message)
+    host_stats = rate_controller.get_host_stats()
+    for host, host_info in host_stats.items():
+        print(f"Requested {host_info["requests"]} {entity_type_name} URLs from {host} at {host_info["requests_per_second"]} requests per second ({host_info["throttled_requests"]} throttled)")
+    if stats is not None:
+        stats["hosts"] = {**stats.get("hosts", {}), **host_stats}
+        stats["mirror_results"] = stats.get("mirror_results", 0) + mirror_results_count
+        stats["mirror_size_mismatches"] = stats.get("mirror_size_mismatches", 0) + len(mismatches)
+    return results
+
+def get_unsharded_file_sizes_from_uris(uris, entity_type_name, handle_error=None, jobs=None, stats=None, previous_build=None, mirror_uris=None, manifest_path=None, request_state=None):
+    """
+    Fetch the sizes of the files at the given URIs, using `jobs` (by default, `FILE_SIZE_JOBS`) concurrent requests over a shared session.
+    Sizes of S3 files are looked up in the manifest at `manifest_path` (by default, `FILE_SIZE_MANIFEST_PATH`), if any, and then in the persistent file size cache;
+    requests are only made for URIs that are missing from both or due for revalidation, and never if `OFFLINE` is set.
+    If `FILE_SIZE_RETRY_FAILURES` is set, `previous_build` may be given as a tuple of the previous output CSV path, report path, and URI column name;
+    sizes are then reused from the previous output, and only files that failed in the previous build (or are new) are requested, with retries.
+    `mirror_uris` may be given as a sequence of alternative URIs (or empty values) parallel to `uris`, in which case requests to slow or failing URIs are hedged using the mirrors.
+    Sizes are returned in input order, and errors are passed to `handle_error` in input order once all requests have completed.
+    If a `stats` dict is given, manifest and cache hit counts, cache miss counts, and per-host request rates are added to it.
+    A build that fetches sizes in several batches may pass the same `FileSizeRequestState` to each call, so that the previous build's sizes are only loaded once,
+    and request rates carry over between batches.
+    """
+    if jobs is None:
+        jobs = FILE_SIZE_JOBS
+    if request_state is None:
+        request_state = FileSizeRequestState()
+    uris = list(uris)
+    urls = [get_file_size_url(uri) for uri in uris]
+    uris_by_url = dict(zip(urls, uris))
+    mirror_urls = {} if mirror_uris is None else {
+        url: get_file_size_url(mirror_uri) for url, mirror_uri in zip(urls, mirror_uris) if isinstance(mirror_uri, str) and "://" in mirror_uri
+    }
+    results = {}
+    retries = 0
+    if FILE_SIZE_RETRY_FAILURES and previous_build is not None and all(os.path.exists(path) for path in previous_build[:2]):
+        if request_state.previous_sizes is None:
+            request_state.previous_sizes = load_previous_file_sizes(*previous_build)
+        previous_sizes = request_state.previous_sizes
+        results.update((url, previous_sizes[url]) for url in uris_by_url if url in previous_sizes)
+        retries = FILE_SIZE_RETRIES
+        print(f"Reusing {len(results)} {entity_type_name} file sizes from previous build")
+    reused_count = len(results)
+    if manifest_path is None:
+        manifest_path = FILE_SIZE_MANIFEST_PATH
+    if manifest_path is not None:
+        manifest_sizes = get_file_sizes_from_manifest((uri for url, uri in uris_by_url.items() if url not in results), load_file_size_manifest(manifest_path))
+        results.update((get_file_size_url(uri), FileSizeResult(size)) for uri, size in manifest_sizes.items())
+        print(f"Found {len(manifest_sizes)} {entity_type_name} file sizes in manifest")
+    manifest_count = len(results) - reused_count
+    with FileSizeCache() as cache:
+        cached_entries = cache.get_many(url for url in uris_by_url if url not in results)
+        urls_to_request = []
+        for url, uri in uris_by_url.items():
+            if url in results:
+                continue
+            cached = cached_entries.get(url)
+            if cached is not None and (OFFLINE or cache.is_usable(cached)):
+                results[url] = FileSizeResult(cached.size, etag=cached.etag, last_modified=cached.last_modified)
             else:
-                error_message = f"No `Content-Length` header received"
+                urls_to_request.append((url, uri, cached if cached is not None and cache.should_revalidate(cached) else None))
+        cache_hits = len(results) - reused_count - manifest_count
+        print(f"Found {cache_hits} {entity_type_name} file sizes in cache")
+        fetched_at = time.time()
+        if OFFLINE:
+            results.update((url, FileSizeResult("N/A", "File size is not cached, and can't be requested offline")) for url, _, _ in urls_to_request)
         else:
-            error_message = f"Received {response.status_code} response"
-    except Exception as ex:
-        error_message = str(ex)
-    finally:
-        # Update progress
-        remaining_files = total_files - current_index - 1
-        print(f"Remaining {entity_type_name} files to process: {remaining_files}")
-        # Handle error, if present
-        if error_message is not None:
-            print(f"An error occurred while requesting {uri}: {error_message}")
-            if handle_error is not None:
-                handle_error(uri, error_message)
-        # Return size
-        return size
-
-def get_file_sizes_from_uris(uris, entity_type_name, handle_error=None):
-    total_files = len(uris)
-    return [
-        get_file_size(uri, total_files, index, entity_type_name, handle_error)
-        for index, uri in enumerate(uris)
-    ]
+            results.update(request_file_sizes(urls_to_request, entity_type_name, jobs, stats, retries, mirror_urls, request_state))
+        cache.put_many({
+            url: CachedFileSize(results[url].size, results[url].etag, results[url].last_modified, fetched_at)
+            for url, _, _ in urls_to_request if results[url].error_message is None
+        })
+    if stats is not None:
+        revalidations = sum(1 for _, _, cached in urls_to_request if cached is not None)
+        stats["reused_from_previous_build"] = stats.get("reused_from_previous_build", 0) + reused_count
+        stats["manifest_hits"] = stats.get("manifest_hits", 0) + manifest_count
+        stats["cache_hits"] = stats.get("cache_hits", 0) + cache_hits
+        stats["cache_revalidations"] = stats.get("cache_revalidations", 0) + revalidations
+        stats["cache_misses"] = stats.get("cache_misses", 0) + len(urls_to_request) - revalidations
+    # Handle errors in input order, so that reports are stable across runs
+    if handle_error is not None:
+        for url in urls:
+            error_message = results[url].error_message
+            if error_message is not None:
+                handle_error(url, error_message)
+    return [results[url].size for url in urls]
+
+def parse_file_size_shard(value):
+    """
+    Parse a shard specification of the form "i/n", where i is the zero-based index of the shard and n is the number of shards.
+    """
+    index, count = (int(part) for part in value.split("/"))
+    if not 0 <= index < count:
+        raise ValueError(f"Invalid file size shard {value}")
+    return (index, count)
+
+def get_file_size_shard_index(url, shard_count):
+    return int(hashlib.sha256(url.encode()).hexdigest(), 16) % shard_count
+
+def get_file_size_shard_path(entity_type_name, index, count):
+    return os.path.join(FILE_SIZE_SHARDS_FOLDER_PATH, f"{entity_type_name.replace(" ", "-")}.shard-{index}-of-{count}.csv")
+
+# Entity types whose partial file size tables have been written in this run
+written_shard_entity_types = set()
+
+def make_shard_error_accumulator():
+    errors = {}
+    def handle_error(url, message):
+        errors[url] = message
+    return handle_error, errors
+
+def get_file_sizes_from_uris(uris, entity_type_name, handle_error=None, mirror_uris=None, **kwargs):
+    """
+    Fetch the sizes of the files at the given URIs, as described for `get_unsharded_file_sizes_from_uris`.
+    If `FILE_SIZE_SHARD` is set, only the URIs in the shard are requested, and sizes of the others are "N/A";
+    the shard's sizes and errors are also saved in a partial table, to be combined with other shards' tables by `merge_file_size_shards.py`.
+    """
+    if FILE_SIZE_SHARD is None:
+        return get_unsharded_file_sizes_from_uris(uris, entity_type_name, handle_error, mirror_uris=mirror_uris, **kwargs)
+    shard_index, shard_count = parse_file_size_shard(FILE_SIZE_SHARD)
+    uris = list(uris)
+    mirror_uris = [None] * len(uris) if mirror_uris is None else list(mirror_uris)
+    shard_items = [(uri, mirror_uri) for uri, mirror_uri in zip(uris, mirror_uris) if get_file_size_shard_index(get_file_size_url(uri), shard_count) == shard_index]
+    print(f"Requesting {len(shard_items)} of {len(uris)} {entity_type_name} file sizes in shard {shard_index}/{shard_count}")
+    shard_uris = [uri for uri, _ in shard_items]
+    handle_shard_error, shard_errors = make_shard_error_accumulator()
+    shard_sizes = get_unsharded_file_sizes_from_uris(shard_uris, entity_type_name, handle_shard_error, mirror_uris=[mirror_uri for _, mirror_uri in shard_items], **kwargs)
+    # Save the partial table, appending to it if sizes were already requested for this entity type in this run, as in chunked builds
+    os.makedirs(FILE_SIZE_SHARDS_FOLDER_PATH, exist_ok=True)
+    shard_urls = [get_file_size_url(uri) for uri in shard_uris]
+    is_continued = entity_type_name in written_shard_entity_types
+    pd.DataFrame({
+        "url": shard_urls,
+        "file_size": shard_sizes,
+        "error_message": [shard_errors.get(url, "") for url in shard_urls]
+    }).drop_duplicates("url").to_csv(get_file_size_shard_path(entity_type_name, shard_index, shard_count), mode="a" if is_continued else "w", header=not is_continued, index=False)
+    written_shard_entity_types.add(entity_type_name)
+    # Handle errors in input order, so that reports are stable across runs
+    if handle_error is not None:
+        for url in shard_urls:
+            if url in shard_errors:
+                handle_error(url, shard_errors[url])
+    sizes_by_uri = dict(zip(shard_uris, shard_sizes))
+    return [sizes_by_uri.get(uri, "N/A") for uri in uris]
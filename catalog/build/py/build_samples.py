@@ -1,6 +1,7 @@
 import os
 from linkml_runtime.utils.schemaview import SchemaView
-from build_help import load_and_validate_csv, format_file_errors, download_file
+from build_help import SPEC_DRY_RUN, load_and_validate_csv, format_file_errors, take_source_parse_stats
+from downloads import download_file_with_info
 from reports import EntityTypeReport, get_error_strings_for_file, generate_catalog_report
 import generated_schema.samples as schema
 
@@ -17,15 +18,19 @@ BIOSAMPLES_TABLE_URL = "https://github.com/human-pangenomics/hprc_intermediate_a
 
 
 def build_samples():
+    if SPEC_DRY_RUN:
+        print(f"Samples table: {BIOSAMPLES_TABLE_URL}")
+        return
     schemaview = SchemaView(SAMPLE_SCHEMA_PATH)
-    samples_file = download_file(BIOSAMPLES_TABLE_URL, DOWNLOADS_FOLDER_PATH)
+    samples_file, samples_file_info = download_file_with_info(BIOSAMPLES_TABLE_URL, DOWNLOADS_FOLDER_PATH)
     df, errors = load_and_validate_csv(samples_file, schema.Sample, schemaview)
     if errors:
         print(f"\nValidation errors:\n\n{format_file_errors(errors)}")
         print(f"\nFound {len(errors)} errors")
     
     EntityTypeReport(
-        validation_errors=[get_error_strings_for_file(samples_file.name, errors)]
+        validation_errors=[get_error_strings_for_file(samples_file_info.filename, errors)],
+        parse_stats=take_source_parse_stats()
     ).save_to(REPORT_PATH)
 
     df.to_csv(OUTPUT_FILE_PATH, index=False)
@@ -2,7 +2,8 @@ import os
 import pandas as pd
 import numpy as np
 from linkml_runtime.utils.schemaview import SchemaView
-from build_help import load_and_validate_csv, format_errors_by_file, download_file, get_file_sizes_from_uris
+from build_help import SPEC_CHUNK_SIZE, SPEC_DRY_RUN, FileSizeRequestState, iter_validated_csv_chunks, load_and_validate_csv, format_errors_by_file, get_file_sizes_from_uris, print_file_size_request_estimate, take_source_parse_stats, write_chunks_to_csv
+from downloads import download_file_with_info
 from reports import EntityTypeReport, get_error_strings_per_file, make_uri_error_accumulator, generate_catalog_report
 import generated_schema.sequencing_data as schema
 
@@ -25,23 +26,23 @@ METADA_SOURCES = [
 ]
 
 
-def download_source_files(urls_source, output_folder_path, get_filename=None, get_url=lambda v: v, get_result_info=lambda v, _: v):
+def download_source_files(urls_source, output_folder_path, get_filename=None, get_url=lambda v: v, get_result_info=lambda path, info, source: path):
     paths_info = []
     for source in urls_source:
         # Get the filename and the path where the output will be saved
-        paths_info.append(get_result_info(download_file(get_url(source), output_folder_path, get_filename and get_filename(source)), source))
+        paths_info.append(get_result_info(*download_file_with_info(get_url(source), output_folder_path, get_filename and get_filename(source)), source))
     return paths_info
 
 
-def join_samples(metadata_paths, handle_uri_error):
+def join_samples(metadata_paths, handle_uri_error, file_size_stats=None, file_size_manifest_path=None):
     schemaview = SchemaView(SEQUENCING_DATA_SCHEMA_PATH)
     # Generate each column across all provided sheets
     metadata_list = []
     errors_by_file = {}
-    for path, model in metadata_paths:
+    for path, file_name, model in metadata_paths:
         file_df, file_errors = load_and_validate_csv(path, model, schemaview)
         metadata_list.append(file_df)
-        if file_errors: errors_by_file[path.name] = file_errors
+        if file_errors: errors_by_file[file_name] = file_errors
     metadata_columns = np.unique([col for df in metadata_list for col in df.columns])
     # Concatenate all the provided metadata sheets
     all_metadata = (
@@ -50,25 +51,63 @@ def join_samples(metadata_paths, handle_uri_error):
         .fillna("N/A")
     )
 
-    with_size = all_metadata.assign(file_size=get_file_sizes_from_uris(all_metadata["path"], "sequencing data", handle_uri_error))
+    with_size = all_metadata.assign(file_size=get_file_sizes_from_uris(all_metadata["path"], "sequencing data", handle_uri_error, stats=file_size_stats, previous_build=(OUTPUT_FILE_PATH, REPORT_PATH, "path"), manifest_path=file_size_manifest_path))
 
     return (with_size, errors_by_file)
 
 
-def build_sequencing_data():
-    metadata_files = download_source_files(METADA_SOURCES, DOWNLOADS_FOLDER_PATH, lambda source: source.get("filename"), lambda source: source["url"], lambda path, source: (path, source["model"]))
+def join_samples_in_chunks(metadata_paths, handle_uri_error, file_size_stats=None, file_size_manifest_path=None):
+    """
+    Validate and join the sheets in chunks, as done by `join_samples`, writing the output incrementally.
+    Returns the validation errors by file.
+    """
+    schemaview = SchemaView(SEQUENCING_DATA_SCHEMA_PATH)
+    errors_by_file = {}
+    def iter_metadata_chunks():
+        for path, file_name, model in metadata_paths:
+            for chunk_df, chunk_errors in iter_validated_csv_chunks(path, model, schemaview, SPEC_CHUNK_SIZE):
+                if chunk_errors: errors_by_file.setdefault(file_name, []).extend(chunk_errors)
+                yield chunk_df
+    # Shared by the chunks, so that the previous build's sizes are loaded once and request rates carry over
+    file_size_request_state = FileSizeRequestState()
+    write_chunks_to_csv(
+        iter_metadata_chunks(),
+        OUTPUT_FILE_PATH,
+        lambda df: df.assign(file_size=get_file_sizes_from_uris(
+            df["path"], "sequencing data", handle_uri_error, stats=file_size_stats, previous_build=(OUTPUT_FILE_PATH, REPORT_PATH, "path"), manifest_path=file_size_manifest_path, request_state=file_size_request_state
+        )),
+        fill_value="N/A",
+        sort_columns=True
+    )
+    return errors_by_file
+
+
+def build_sequencing_data(file_size_manifest_path=None):
+    if SPEC_DRY_RUN:
+        print("\n".join(f"{source['filename']}: {source['url']}" for source in METADA_SOURCES))
+        print_file_size_request_estimate("sequencing data", OUTPUT_FILE_PATH, "path", file_size_manifest_path)
+        return
+    metadata_files = download_source_files(METADA_SOURCES, DOWNLOADS_FOLDER_PATH, lambda source: source.get("filename"), lambda source: source["url"], lambda path, info, source: (path, info.filename, source["model"]))
     handle_uri_error, uri_errors = make_uri_error_accumulator()
-    joined, errors_by_file = join_samples(metadata_files, handle_uri_error)
+    file_size_stats = {}
+    if SPEC_CHUNK_SIZE:
+        joined = None
+        errors_by_file = join_samples_in_chunks(metadata_files, handle_uri_error, file_size_stats, file_size_manifest_path)
+    else:
+        joined, errors_by_file = join_samples(metadata_files, handle_uri_error, file_size_stats, file_size_manifest_path)
     if errors_by_file:
         print(f"\nValidation errors:\n\n{format_errors_by_file(errors_by_file)}")
         print(f"\nFound errors in {len(errors_by_file)} source files")
     
     EntityTypeReport(
         validation_errors=get_error_strings_per_file(errors_by_file),
-        file_uri_errors=uri_errors
+        file_uri_errors=uri_errors,
+        file_size_stats=file_size_stats,
+        parse_stats=take_source_parse_stats()
     ).save_to(REPORT_PATH)
 
-    joined.to_csv(OUTPUT_FILE_PATH, index=False)
+    if joined is not None:
+        joined.to_csv(OUTPUT_FILE_PATH, index=False)
 
     print("\nSequencing data processing complete!\n")
 
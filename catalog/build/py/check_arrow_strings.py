@@ -0,0 +1,43 @@
+import glob
+import os
+import sys
+import build_help
+
+# Determine the base directory of the script
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Files checked if none are given on the command line
+DEFAULT_FILE_PATHS = sorted(glob.glob(os.path.join(BASE_DIR, "../intermediate/*.csv")))
+
+
+def parse_to_csv(path, arrow_strings):
+    """
+    Parse a file in the way that source files read as strings are parsed, with or without `ARROW_STRINGS`, and write it back as CSV.
+    """
+    build_help.ARROW_STRINGS = arrow_strings
+    df = build_help.parse_csv(path, {"sep": ",", "usecols": lambda name: not name.startswith("Unnamed:"), "dtype": str, "keep_default_na": False})
+    return df.to_csv(index=False).encode()
+
+
+def check_arrow_strings(paths):
+    """
+    Check that each file is parsed into the same CSV output, byte for byte, with and without `ARROW_STRINGS`, returning whether all of them are.
+    """
+    all_match = True
+    for path in paths:
+        default_output = parse_to_csv(path, False)
+        arrow_output = parse_to_csv(path, True)
+        if default_output == arrow_output:
+            print(f"{path}: same output")
+        else:
+            all_match = False
+            default_lines = default_output.splitlines()
+            arrow_lines = arrow_output.splitlines()
+            line_index = next((i for i, (a, b) in enumerate(zip(default_lines, arrow_lines)) if a != b), min(len(default_lines), len(arrow_lines)))
+            print(f"{path}: outputs differ, starting at line {line_index + 1}")
+    return all_match
+
+
+if __name__ == "__main__":
+    if not check_arrow_strings(sys.argv[1:] or DEFAULT_FILE_PATHS):
+        sys.exit(1)
@@ -0,0 +1,184 @@
+import os
+import types
+import typing
+from dataclasses import astuple, dataclass, is_dataclass
+from enum import Enum
+from functools import cache
+import annotated_types
+import numpy as np
+import pandas as pd
+
+# Whether rows are first checked against checks compiled from the LinkML schema, so that only rows that may be invalid are validated with Pydantic
+COMPILED_VALIDATION = os.environ.get("HPRC_COMPILED_VALIDATION", "1") not in ("", "0")
+
+LINKML_RANGE_TYPES = {"string": str, "integer": int, "float": float, "boolean": bool}
+
+@dataclass
+class SlotCheck:
+    """
+    Checks of a model field's values that, when passed, guarantee that Pydantic accepts them.
+    """
+    name: str
+    type: type
+    nullable: bool
+    # Whether the field's column may be absent, in which case the field is given a valid default
+    may_be_absent: bool
+    enum_values: list | None = None
+    pattern: str | None = None
+    minimum_value: int | float | None = None
+    maximum_value: int | float | None = None
+
+def get_optional_type(annotation):
+    """
+    Get the type wrapped by an `Optional` annotation, or `None` if the annotation isn't optional.
+    """
+    if typing.get_origin(annotation) not in (typing.Union, types.UnionType):
+        return None
+    args = [arg for arg in typing.get_args(annotation) if arg is not type(None)]
+    return args[0] if len(args) == 1 else None
+
+def get_pattern_validator_pattern(model, name):
+    """
+    Get the pattern checked by the validator that LinkML generates for a slot with a pattern, if the model has one for the given field.
+    """
+    validator = model.__pydantic_decorators__.field_validators.get(f"pattern_{name}")
+    if validator is None or tuple(validator.info.fields) != (name,) or validator.info.mode != "after":
+        return None
+    return next((const for const in validator.func.__code__.co_consts if isinstance(const, str) and const.startswith("^")), None)
+
+def compile_slot_check(schemaview, model, name):
+    """
+    Compile the checks of a field from the induced slot of the model's class, or return `None` if the slot uses features that aren't compiled,
+    or if the model doesn't validate the field in exactly the way the slot specifies.
+    """
+    slot = schemaview.induced_slot(name, model.__name__)
+    field = model.__pydantic_fields__[name]
+    if slot.multivalued or slot.any_of or slot.exactly_one_of or slot.none_of or slot.all_of or slot.equals_string or slot.structured_pattern:
+        return None
+    optional_type = get_optional_type(field.annotation)
+    nullable = optional_type is not None
+    if nullable == bool(slot.required):
+        return None
+    field_type = optional_type if nullable else field.annotation
+    may_be_absent = not field.is_required() and nullable and field.get_default() is None
+    check = SlotCheck(name, field_type, nullable, may_be_absent, pattern=slot.pattern, minimum_value=slot.minimum_value, maximum_value=slot.maximum_value)
+    if slot.range in schemaview.all_enums():
+        check.enum_values = list(schemaview.get_enum(slot.range).permissible_values.keys())
+        if not (isinstance(field_type, type) and issubclass(field_type, Enum) and sorted(member.value for member in field_type) == sorted(check.enum_values)):
+            return None
+    elif LINKML_RANGE_TYPES.get(slot.range) is not field_type:
+        return None
+    if get_pattern_validator_pattern(model, name) != slot.pattern:
+        return None
+    constraints = {(type(item), *astuple(item)) if is_dataclass(item) else item for item in field.metadata}
+    expected_constraints = {(annotated_types.Ge, slot.minimum_value)} if slot.minimum_value is not None else set()
+    if slot.maximum_value is not None:
+        expected_constraints.add((annotated_types.Le, slot.maximum_value))
+    if constraints != expected_constraints:
+        return None
+    return check
+
+@cache
+def compile_model_checks(schemaview, model):
+    """
+    Compile checks of the values of a model's fields from the LinkML schema that the model was generated from,
+    or return `None` if the model can't be checked in this way, in which case every row is to be validated with Pydantic.
+    """
+    config = model.model_config
+    if not COMPILED_VALIDATION or model.__name__ not in schemaview.all_classes() or config.get("strict") or config.get("extra") == "forbid":
+        return None
+    decorators = model.__pydantic_decorators__
+    if decorators.model_validators or decorators.root_validators or decorators.validators:
+        return None
+    checks = [compile_slot_check(schemaview, model, name) for name in model.__pydantic_fields__]
+    if any(check is None for check in checks):
+        return None
+    # Any field validators other than those of the slots' patterns may reject values that pass the checks
+    pattern_validator_names = {f"pattern_{check.name}" for check in checks if check.pattern is not None}
+    if set(decorators.field_validators.keys()) != pattern_validator_names:
+        return None
+    return checks
+
+def get_equality_mask(column, value, values=None):
+    """
+    Get a boolean array of which values of a column equal a given value.
+    Object columns are compared as NumPy arrays, which is much faster than comparing them as Pandas series; `values` may be given as the column's values in an object array.
+    """
+    if column.dtype == object:
+        try:
+            return np.asarray((column.to_numpy() if values is None else values) == value, dtype=bool)
+        except TypeError:
+            # Raised by values such as `pd.NA`, whose comparisons are ambiguous
+            pass
+    return column.eq(value).to_numpy(dtype=bool, na_value=False)
+
+def match_strings(column, pattern, full=False):
+    """
+    Get a boolean array of which values of a column are strings that match a pattern, or that fully match it if `full` is set,
+    using Python regular expressions, as in the validators generated by LinkML. Each distinct value is only matched once.
+    """
+    codes, uniques = pd.factorize(column)
+    if len(uniques) == 0:
+        return np.zeros(len(column), dtype=bool)
+    unique_values = pd.Series(uniques, dtype=object)
+    try:
+        matches = unique_values.str.fullmatch(pattern, na=False) if full else unique_values.str.match(pattern, na=False)
+    except AttributeError:
+        # Series without any strings have no `str` accessor
+        return np.zeros(len(column), dtype=bool)
+    return np.where(codes >= 0, matches.to_numpy(dtype=bool)[codes], False)
+
+def get_string_mask(column):
+    """
+    Get a boolean array of which values of a column are strings.
+    """
+    if isinstance(column.dtype, pd.StringDtype) or pd.api.types.infer_dtype(column, skipna=False) == "string":
+        return column.notna().to_numpy()
+    return column.map(lambda value: isinstance(value, str)).to_numpy(dtype=bool)
+
+def get_check_failures(check, column, cast_values, is_cast):
+    """
+    Get a boolean array of which of the rows in `is_cast` fail a field's checks, given the field's source column and cast values.
+    """
+    is_empty = get_equality_mask(column, "")
+    is_failed = is_empty & is_cast if not check.nullable else np.zeros(len(column), dtype=bool)
+    if check.type is str or check.enum_values is not None:
+        is_failed |= ~get_string_mask(column) & is_cast
+    is_checked = is_cast & ~(is_empty | is_failed)
+    if not is_checked.any():
+        return is_failed
+    checked_positions = np.flatnonzero(is_checked)
+    checked_column = column[is_checked].astype(object)
+    is_valid = np.ones(len(checked_positions), dtype=bool)
+    if check.enum_values is not None:
+        is_valid &= pd.Categorical(checked_column.to_numpy(), categories=check.enum_values).codes >= 0
+    if check.pattern is not None:
+        is_valid &= match_strings(checked_column, check.pattern)
+    if check.minimum_value is not None or check.maximum_value is not None:
+        checked_values = cast_values[is_checked]
+        # NaN values, such as those of "nan" cast to floats, are out of any range, and are left out of the comparisons, in which they'd be invalid values
+        is_compared = ~pd.isna(checked_values)
+        is_valid &= is_compared
+        compared_values = checked_values[is_compared]
+        if check.minimum_value is not None:
+            is_valid[is_compared] &= (compared_values >= check.minimum_value).astype(bool)
+        if check.maximum_value is not None:
+            is_valid[is_compared] &= (compared_values <= check.maximum_value).astype(bool)
+    is_failed[checked_positions[~is_valid]] = True
+    return is_failed
+
+def get_rows_to_validate(df, cast_columns, is_cast, schemaview, model):
+    """
+    Get a boolean array of which of the rows in `is_cast`, whose values have been cast into `cast_columns`, may be invalid and need to be validated with Pydantic.
+    """
+    checks = compile_model_checks(schemaview, model)
+    if checks is None or df.columns.has_duplicates:
+        return is_cast.copy()
+    needs_validation = np.zeros(len(df), dtype=bool)
+    for check in checks:
+        if check.name not in df:
+            if not check.may_be_absent:
+                return is_cast.copy()
+            continue
+        needs_validation |= get_check_failures(check, df[check.name], cast_columns[check.name], is_cast)
+    return needs_validation
@@ -0,0 +1,202 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import zlib
+from dataclasses import dataclass, asdict, replace
+from pathlib import Path
+from urllib.parse import urlparse
+import requests
+from http_transport import get_default_session
+
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Suffixes of source files that are already compressed, which Pandas decompresses when parsing
+COMPRESSED_FILE_SUFFIXES = {".gz", ".zst", ".bz2", ".xz", ".zip"}
+
+# Name of the file, in the downloads folder, that records information about each downloaded URL
+DOWNLOAD_MANIFEST_NAME = "downloads.json"
+
+# Whether to use previously-downloaded copies of files instead of making any requests
+OFFLINE = os.environ.get("HPRC_OFFLINE", "") not in ("", "0")
+
+download_manifest_lock = threading.Lock()
+
+def get_umask():
+    # The umask can only be read by setting it, so this is done once, before any threads are started
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+# Permissions of files written atomically, which are those that `open` would give them, rather than the owner-only permissions of temporary files
+WRITTEN_FILE_MODE = 0o666 & ~get_umask()
+
+@dataclass
+class DownloadInfo:
+    url: str
+    filename: str
+    sha256: str
+    bytes: int
+    seconds: float
+    downloaded_at: float
+    etag: str | None = None
+    last_modified: str | None = None
+    stored_filename: str | None = None
+    transferred_bytes: int | None = None
+
+    def get_stored_filename(self):
+        return self.filename if self.stored_filename is None else self.stored_filename
+
+    @property
+    def bytes_per_second(self):
+        return (self.bytes if self.transferred_bytes is None else self.transferred_bytes) / max(self.seconds, 1e-6)
+
+def read_download_manifest(output_folder_path):
+    """
+    Read the manifest of downloads in the given folder, as a dict mapping URLs to `DownloadInfo`.
+    """
+    path = Path(output_folder_path, DOWNLOAD_MANIFEST_NAME)
+    if not path.exists():
+        return {}
+    with open(path) as f:
+        return {url: DownloadInfo(**info) for url, info in json.load(f).items()}
+
+def record_download(output_folder_path, info):
+    """
+    Save information about a download to the manifest in the given folder, returning the information about the URL's previous download, if any.
+    """
+    with download_manifest_lock:
+        manifest = read_download_manifest(output_folder_path)
+        previous_info = manifest.get(info.url)
+        manifest[info.url] = info
+        write_file_atomically(
+            Path(output_folder_path, DOWNLOAD_MANIFEST_NAME),
+            lambda f: f.write(json.dumps({url: asdict(url_info) for url, url_info in manifest.items()}, indent=2, sort_keys=True).encode())
+        )
+    return previous_info
+
+def write_file_atomically(output_path, write):
+    """
+    Call `write` with a binary file in the same folder as `output_path`, and then move the file to `output_path`, so that an interrupted write doesn't leave a partial file behind.
+    """
+    with tempfile.NamedTemporaryFile("wb", dir=Path(output_path).parent, prefix=f".{Path(output_path).name}.", delete=False) as f:
+        try:
+            result = write(f)
+        except BaseException:
+            f.close()
+            os.unlink(f.name)
+            raise
+    os.chmod(f.name, WRITTEN_FILE_MODE)
+    os.replace(f.name, output_path)
+    return result
+
+def iter_gunzipped(chunks):
+    """
+    Decompress a stream of gzip data given as an iterable of chunks, handling streams with multiple gzip members.
+    """
+    decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        while chunk:
+            yield decompressor.decompress(chunk)
+            chunk = decompressor.unused_data
+            if chunk:
+                decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+    yield decompressor.flush()
+
+def iter_file_chunks(path):
+    with open(path, "rb") as f:
+        yield from iter(lambda: f.read(DOWNLOAD_CHUNK_SIZE), b"")
+
+def get_file_sha256(path, gzipped=False):
+    """
+    Get the SHA-256 digest of a file, or of its decompressed content if it's `gzipped`.
+    """
+    digest = hashlib.sha256()
+    chunks = iter_file_chunks(path)
+    for chunk in iter_gunzipped(chunks) if gzipped else chunks:
+        digest.update(chunk)
+    return digest.hexdigest()
+
+def is_stored_compressed(info):
+    return info.get_stored_filename() != info.filename
+
+def get_cached_download(url, output_folder_path, filename):
+    """
+    Get the recorded information about the previous download of a URL, if the downloaded file is still present and unmodified.
+    """
+    info = read_download_manifest(output_folder_path).get(url)
+    if info is None or info.filename != filename:
+        return None
+    stored_path = Path(output_folder_path, info.get_stored_filename())
+    if not stored_path.exists() or get_file_sha256(stored_path, is_stored_compressed(info)) != info.sha256:
+        return None
+    return info
+
+def download_file_with_info(url, output_folder_path, filename=None):
+    """
+    Download a file by streaming it to disk, computing the SHA-256 digest of its content along the way.
+    Compressed transfer encodings are negotiated; if the server sends gzip-encoded content, and the file isn't itself compressed,
+    the gzip stream is stored as-is, with `.gz` appended to the filename, so that Pandas can decompress it when parsing.
+    The digest, validators, and transfer stats are recorded in the downloads folder's manifest, so that it can be determined whether a file has changed since it was last downloaded.
+    If an unmodified copy from a previous download is present, the request is made conditional on the file having changed, and the copy is reused if it hasn't;
+    if `OFFLINE` is set, the copy is reused without making any request.
+    Returns a tuple of the path of the stored file and the `DownloadInfo`, whose `filename` should be used to refer to the source file.
+    """
+    if filename is None:
+        filename = Path(urlparse(url).path).name
+    cached_info = get_cached_download(url, output_folder_path, filename)
+    if OFFLINE:
+        if cached_info is None:
+            raise RuntimeError(f"{url} has not been downloaded to {Path(output_folder_path, filename)}, and can't be downloaded offline")
+        output_path = Path(output_folder_path, cached_info.get_stored_filename())
+        print(f"Using offline copy of:\n {url}\n at {output_path}")
+        return (output_path, cached_info)
+    headers = {"Accept-Encoding": requests.utils.DEFAULT_ACCEPT_ENCODING}
+    if cached_info is not None:
+        if cached_info.etag is not None: headers["If-None-Match"] = cached_info.etag
+        if cached_info.last_modified is not None: headers["If-Modified-Since"] = cached_info.last_modified
+    start_time = time.time()
+    with get_default_session().get(url, stream=True, headers=headers) as r:
+        if r.status_code == 304 and cached_info is not None:
+            output_path = Path(output_folder_path, cached_info.get_stored_filename())
+            print(f"Not modified:\n {url}\n at {output_path}")
+            info = replace(cached_info, seconds=time.time() - start_time, downloaded_at=start_time, transferred_bytes=0)
+            record_download(output_folder_path, info)
+            return (output_path, info)
+        if r.status_code != 200:
+            raise RuntimeError(f"{url} caused error {r.status_code}. See details below:\n {r.text}")
+        store_gzipped = r.headers.get("Content-Encoding", "").strip().lower() == "gzip" and Path(filename).suffix not in COMPRESSED_FILE_SUFFIXES
+        stored_filename = f"{filename}.gz" if store_gzipped else filename
+        output_path = Path(output_folder_path, stored_filename)
+        print(f"Downloading:\n {url}\n to {output_path}")
+        def write_response(f):
+            def iter_written_chunks(chunks):
+                for chunk in chunks:
+                    f.write(chunk)
+                    yield chunk
+            digest = hashlib.sha256()
+            size = 0
+            if store_gzipped:
+                # Store the raw gzip stream, and decompress it only to compute the digest
+                content_chunks = iter_gunzipped(iter_written_chunks(r.raw.stream(DOWNLOAD_CHUNK_SIZE, decode_content=False)))
+            else:
+                content_chunks = iter_written_chunks(r.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE))
+            for chunk in content_chunks:
+                digest.update(chunk)
+                size += len(chunk)
+            return (digest.hexdigest(), size)
+        sha256, size = write_file_atomically(output_path.resolve(), write_response)
+        transferred_bytes = r.raw.tell()
+    info = DownloadInfo(
+        url, filename, sha256, size, time.time() - start_time, start_time, r.headers.get("ETag"), r.headers.get("Last-Modified"),
+        stored_filename, transferred_bytes
+    )
+    previous_info = record_download(output_folder_path, info)
+    change_text = "" if previous_info is None else " (unchanged)" if previous_info.sha256 == sha256 else " (changed)"
+    print(f"Downloaded {size} bytes ({transferred_bytes} transferred) in {info.seconds:.2f}s ({info.bytes_per_second / 1e6:.2f} MB/s){change_text}")
+    return (output_path, info)
+
+def download_file(url, output_folder_path, filename=None):
+    return download_file_with_info(url, output_folder_path, filename)[0]
@@ -0,0 +1,103 @@
+import os
+import sqlite3
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+# Base directory of the script
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+FILE_SIZE_CACHE_PATH = os.path.join(BASE_DIR, "../temporary/file_sizes.sqlite")
+
+# Age in seconds after which cached sizes are revalidated under the "conditional" policy
+FILE_SIZE_CACHE_TTL = float(os.environ.get("HPRC_FILE_SIZE_CACHE_TTL", 7 * 24 * 60 * 60))
+
+"""
+Revalidation policies:
+never -- Cached sizes are used regardless of their age.
+conditional -- Cached sizes younger than the TTL are used; older ones are revalidated using a conditional HEAD request.
+always -- Every URI is requested with a plain HEAD request, and the cache is only written to.
+"""
+FILE_SIZE_CACHE_REVALIDATION_POLICIES = ("never", "conditional", "always")
+FILE_SIZE_CACHE_REVALIDATION = os.environ.get("HPRC_FILE_SIZE_CACHE_REVALIDATION", "conditional")
+
+@dataclass
+class CachedFileSize:
+    size: int
+    etag: str | None
+    last_modified: str | None
+    fetched_at: float
+
+class FileSizeCache:
+    """
+    Persistent cache of file sizes, stored in SQLite.
+    If `read_only` is set, as for dry runs, the database is opened without being created or written to, and a missing database is treated as empty.
+    """
+    def __init__(self, path=FILE_SIZE_CACHE_PATH, ttl=FILE_SIZE_CACHE_TTL, revalidation=FILE_SIZE_CACHE_REVALIDATION, read_only=False):
+        if revalidation not in FILE_SIZE_CACHE_REVALIDATION_POLICIES:
+            raise ValueError(f"Unknown file size cache revalidation policy {revalidation!r}")
+        self.ttl = ttl
+        self.revalidation = revalidation
+        if read_only:
+            self.connection = sqlite3.connect(f"{Path(path).resolve().as_uri()}?mode=ro", uri=True) if os.path.exists(path) else None
+            return
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS file_sizes (uri TEXT PRIMARY KEY, size INTEGER NOT NULL, etag TEXT, last_modified TEXT, fetched_at REAL NOT NULL)"
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+
+    def get_many(self, uris):
+        """
+        Get a dict mapping each of the given URIs that are in the cache to its cached entry.
+        """
+        entries = {}
+        if self.connection is None:
+            return entries
+        uris = list(uris)
+        # Query in batches to stay under SQLite's limit on the number of parameters
+        for start in range(0, len(uris), 500):
+            batch = uris[start:start + 500]
+            rows = self.connection.execute(
+                f"SELECT uri, size, etag, last_modified, fetched_at FROM file_sizes WHERE uri IN ({", ".join("?" * len(batch))})",
+                batch
+            )
+            entries.update((uri, CachedFileSize(*values)) for uri, *values in rows)
+        return entries
+
+    def put_many(self, entries):
+        """
+        Store the given dict of URIs and `CachedFileSize` entries.
+        """
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO file_sizes (uri, size, etag, last_modified, fetched_at) VALUES (?, ?, ?, ?, ?)",
+                [(uri, e.size, e.etag, e.last_modified, e.fetched_at) for uri, e in entries.items()]
+            )
+
+    def is_usable(self, entry):
+        """
+        Determine whether a cached entry may be used without making a request, according to the revalidation policy.
+        """
+        match self.revalidation:
+            case "never":
+                return True
+            case "conditional":
+                return time.time() - entry.fetched_at < self.ttl
+            case "always":
+                return False
+
+    def should_revalidate(self, entry):
+        """
+        Determine whether a request for an unusable cached entry should be made conditional on the entry being unchanged.
+        """
+        return self.revalidation == "conditional" and (entry.etag is not None or entry.last_modified is not None)
@@ -0,0 +1,84 @@
+import json
+import os
+from functools import cache
+from urllib.parse import unquote as url_unquote, unquote_plus as url_unquote_plus
+import pandas as pd
+
+# Path of a local S3 Inventory manifest (`manifest.json`) or listing file (CSV, TSV, or Parquet) to get file sizes from
+FILE_SIZE_MANIFEST_PATH = os.environ.get("HPRC_FILE_SIZE_MANIFEST")
+
+def decode_keys(keys, decode):
+    # Only decode the keys that contain escapes, which are usually few
+    escaped = keys.str.contains("%", regex=False) | (keys.str.contains("+", regex=False) if decode is url_unquote_plus else False)
+    return keys.where(~escaped, keys[escaped].map(decode))
+
+def get_manifest_keys_from_uris(uris):
+    """
+    Get the normalized keys, consisting of bucket and decoded object key, of the given Series of S3 URIs.
+    """
+    return decode_keys(uris.str.slice(5), url_unquote)
+
+def find_inventory_data_file(manifest_dir, file_key):
+    file_name = os.path.basename(file_key)
+    candidate_paths = [os.path.join(manifest_dir, file_name), os.path.join(manifest_dir, "data", file_name), os.path.join(manifest_dir, "..", "data", file_name)]
+    for path in candidate_paths:
+        if os.path.exists(path):
+            return path
+    raise FileNotFoundError(f"Inventory data file {file_name} not found near {manifest_dir}")
+
+def read_inventory_manifest(path):
+    """
+    Read the data files listed in an S3 Inventory `manifest.json`, which are looked up by name next to the manifest or in a nearby `data` folder.
+    """
+    with open(path) as f:
+        manifest = json.load(f)
+    manifest_dir = os.path.dirname(path)
+    file_paths = [find_inventory_data_file(manifest_dir, file_info["key"]) for file_info in manifest["files"]]
+    match manifest["fileFormat"].upper():
+        case "CSV":
+            # Inventory CSV files have no header, and URL-encode keys
+            names = [name.strip().lower() for name in manifest["fileSchema"].split(",")]
+            df = pd.concat(
+                [pd.read_csv(file_path, header=None, names=names, usecols=["bucket", "key", "size"], dtype=str, keep_default_na=False) for file_path in file_paths],
+                ignore_index=True
+            )
+            return df.assign(key=decode_keys(df["key"], url_unquote_plus))
+        case "PARQUET":
+            return pd.concat([pd.read_parquet(file_path, columns=["bucket", "key", "size"]) for file_path in file_paths], ignore_index=True)
+        case file_format:
+            raise ValueError(f"Unsupported inventory file format {file_format}")
+
+def read_listing_file(path):
+    """
+    Read a listing file with `bucket` and `key` columns or a `uri` column of S3 URIs, and a `size` column.
+    """
+    if path.endswith(".parquet"):
+        df = pd.read_parquet(path)
+    else:
+        df = pd.read_csv(path, sep="\t" if ".tsv" in path else ",", dtype=str, keep_default_na=False)
+    df = df.rename(columns=str.lower)
+    if "uri" in df:
+        return pd.DataFrame({"manifest_key": get_manifest_keys_from_uris(df["uri"]), "size": df["size"]})
+    return df[["bucket", "key", "size"]]
+
+@cache
+def load_file_size_manifest(path):
+    """
+    Load a manifest of file sizes as a DataFrame with `manifest_key` and integer `size` columns.
+    Manifests are only loaded once per build, and the returned DataFrame must not be modified.
+    """
+    df = read_inventory_manifest(path) if path.endswith(".json") else read_listing_file(path)
+    if "manifest_key" not in df:
+        df = pd.DataFrame({"manifest_key": df["bucket"] + "/" + df["key"], "size": df["size"]})
+    sizes = pd.to_numeric(df["size"], errors="coerce")
+    return df.assign(size=sizes)[sizes.notna()].astype({"size": "int64"}).drop_duplicates("manifest_key", keep="last")
+
+def get_file_sizes_from_manifest(uris, manifest_df):
+    """
+    Get the sizes of the given S3 URIs from a loaded manifest.
+    Returns a dict mapping the URIs that were found to their sizes.
+    """
+    uri_df = pd.DataFrame({"uri": pd.Series(list(uris), dtype=object)})
+    uri_df = uri_df[uri_df["uri"].str.startswith("s3://")]
+    merged = uri_df.assign(manifest_key=get_manifest_keys_from_uris(uri_df["uri"])).merge(manifest_df, on="manifest_key", how="inner")
+    return dict(zip(merged["uri"], merged["size"].tolist()))
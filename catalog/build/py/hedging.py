@@ -0,0 +1,59 @@
+import math
+import threading
+from concurrent.futures import FIRST_COMPLETED, wait
+
+# Percentile of observed latencies after which a hedged request is sent to the mirror
+HEDGE_LATENCY_PERCENTILE = 95
+# Delay used until enough latencies have been observed to compute the percentile
+HEDGE_DEFAULT_DELAY = 2.0
+HEDGE_MIN_SAMPLES = 20
+
+class LatencyTracker:
+    """
+    Records request latencies, to determine how long to wait for a response before hedging.
+    """
+    def __init__(self, percentile=HEDGE_LATENCY_PERCENTILE, default_delay=HEDGE_DEFAULT_DELAY, min_samples=HEDGE_MIN_SAMPLES):
+        self.percentile = percentile
+        self.default_delay = default_delay
+        self.min_samples = min_samples
+        self.lock = threading.Lock()
+        self.latencies = []
+
+    def record(self, seconds):
+        with self.lock:
+            self.latencies.append(seconds)
+
+    def get_hedge_delay(self):
+        with self.lock:
+            if len(self.latencies) < self.min_samples:
+                return self.default_delay
+            latencies = sorted(self.latencies)
+        return latencies[min(len(latencies) - 1, math.ceil(len(latencies) * self.percentile / 100) - 1)]
+
+def hedge(send_primary, send_mirror, executor, delay, is_success, cross_check=None):
+    """
+    Call `send_primary` on the executor, and if it hasn't returned a successful result within `delay` seconds, call `send_mirror` as well.
+    Returns a tuple of the first successful result (or the primary result, if neither is successful) and whether the mirror was used.
+    If the primary result is successful before `send_mirror` has been started, the mirror request is cancelled.
+    If both results are successful, `cross_check` is called with the primary and mirror results once both have arrived.
+    """
+    primary = executor.submit(send_primary)
+    wait([primary], timeout=delay)
+    if primary.done() and is_success(primary.result()):
+        return (primary.result(), False)
+    mirror = executor.submit(send_mirror)
+    # Cancelled by the thread that ran the primary request as soon as it finishes, before that thread can start the mirror request
+    primary.add_done_callback(lambda future: future.exception() is None and is_success(future.result()) and mirror.cancel())
+    pending = {primary, mirror}
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in (primary, mirror):
+            if future in done and not future.cancelled() and is_success(future.result()):
+                if cross_check is not None:
+                    other = mirror if future is primary else primary
+                    def check_other(other_future):
+                        if not other_future.cancelled() and is_success(other_future.result()):
+                            cross_check(primary.result(), mirror.result())
+                    other.add_done_callback(check_other)
+                return (future.result(), future is mirror)
+    return (primary.result(), False)
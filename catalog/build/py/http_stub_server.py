@@ -0,0 +1,84 @@
+import hashlib
+import os
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from requests.structures import CaseInsensitiveDict
+from http_transport import get_cassette, get_original_url, is_not_modified
+
+# Port to serve on
+STUB_PORT = int(os.environ.get("HPRC_STUB_PORT", 8700))
+# Seconds to wait before answering each request
+STUB_LATENCY = float(os.environ.get("HPRC_STUB_LATENCY", 0))
+# Fraction of the HEAD requests to answer with `STUB_ERROR_STATUS`; which URLs fail is determined by a hash of the URL, so it's the same on every run
+STUB_ERROR_RATE = float(os.environ.get("HPRC_STUB_ERROR_RATE", 0))
+STUB_ERROR_STATUS = int(os.environ.get("HPRC_STUB_ERROR_STATUS", 404))
+# `Content-Length` to answer HEAD requests for unrecorded URLs with; if not set, a size is derived from a hash of the URL
+STUB_CONTENT_LENGTH = os.environ.get("HPRC_STUB_CONTENT_LENGTH")
+
+
+def get_url_fraction(url, salt):
+    """
+    Get a number in [0, 1) that's determined by the URL.
+    """
+    return int(hashlib.sha256(f"{salt}:{url}".encode()).hexdigest()[:8], 16) / 2 ** 32
+
+
+def get_stub_content_length(url):
+    if STUB_CONTENT_LENGTH is not None:
+        return int(STUB_CONTENT_LENGTH)
+    return int(get_url_fraction(url, "size") * 10 ** 10)
+
+
+class StubRequestHandler(BaseHTTPRequestHandler):
+    """
+    Answers requests to redirected URLs (see `http_transport.get_redirected_url`) using the responses recorded in the cassette.
+    HEAD requests for URLs that haven't been recorded are answered with a synthesized `Content-Length`.
+    """
+    protocol_version = "HTTP/1.1"
+
+    def send_stub_response(self, status, headers, body=b""):
+        self.send_response(status)
+        for name, value in headers.items():
+            if name.lower() not in ("connection", "transfer-encoding", "content-length"):
+                self.send_header(name, value)
+        self.send_header("Content-Length", headers.get("Content-Length", str(len(body))) if self.command == "HEAD" else str(len(body)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def answer(self):
+        time.sleep(STUB_LATENCY)
+        url = get_original_url(self.path)
+        cassette = get_cassette()
+        recorded = cassette.get(self.command, url)
+        if self.command == "HEAD":
+            if get_url_fraction(url, "error") < STUB_ERROR_RATE:
+                self.send_stub_response(STUB_ERROR_STATUS, {})
+                return
+            if recorded is None:
+                self.send_stub_response(200, {"Content-Length": str(get_stub_content_length(url))})
+                return
+        if recorded is None:
+            self.send_stub_response(404, {}, f"No response to {self.command} {url} is recorded".encode())
+            return
+        status, headers, body = recorded
+        headers = CaseInsensitiveDict(headers)
+        if status == 200 and is_not_modified(self.headers, headers):
+            self.send_stub_response(304, {name: headers[name] for name in ("ETag", "Last-Modified") if name in headers})
+            return
+        self.send_stub_response(status, headers, body)
+
+    def do_GET(self):
+        self.answer()
+
+    def do_HEAD(self):
+        self.answer()
+
+    def log_message(self, format, *args):
+        pass
+
+
+if __name__ == "__main__":
+    server = ThreadingHTTPServer(("127.0.0.1", STUB_PORT), StubRequestHandler)
+    print(f"Serving stub responses from {get_cassette().path} at http://127.0.0.1:{STUB_PORT}")
+    server.serve_forever()
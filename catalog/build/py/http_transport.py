@@ -0,0 +1,191 @@
+import hashlib
+import io
+import json
+import os
+import threading
+from functools import cache
+from pathlib import Path
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from urllib3 import HTTPResponse
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# How HTTP requests are made: `live` to send them as usual, `record` to send them and save the responses to the cassette, or `replay` to answer them from the cassette without any network access
+HTTP_TRANSPORT = os.environ.get("HPRC_HTTP_TRANSPORT", "live")
+# Folder of the cassette that responses are recorded to or replayed from
+HTTP_CASSETTE_PATH = os.environ.get("HPRC_HTTP_CASSETTE", os.path.join(BASE_DIR, "../temporary/http_cassette"))
+# Base URL of a server, such as the stub server, to send all live requests to in place of their original hosts
+HTTP_REDIRECT_URL = os.environ.get("HPRC_HTTP_REDIRECT")
+
+CASSETTE_INDEX_NAME = "index.jsonl"
+CASSETTE_BODIES_FOLDER_NAME = "bodies"
+
+CONDITIONAL_HEADERS = ("If-None-Match", "If-Modified-Since")
+
+def get_redirected_url(url, redirect_url):
+    """
+    Get the URL at which the redirect server serves the given URL, e.g. `https://example.org/a.csv` becomes `{redirect_url}/https/example.org/a.csv`.
+    """
+    parts = urlsplit(url)
+    return f"{redirect_url.rstrip('/')}/{parts.scheme}/{parts.netloc}{parts.path or '/'}{'?' + parts.query if parts.query else ''}"
+
+def get_original_url(redirected_path):
+    """
+    Get the original URL from the path and query of a redirected URL.
+    """
+    scheme, _, rest = redirected_path.lstrip("/").partition("/")
+    return f"{scheme}://{rest}"
+
+def is_not_modified(request_headers, response_headers):
+    """
+    Determine whether a recorded response satisfies the conditions of a conditional request.
+    """
+    if "If-None-Match" in request_headers and response_headers.get("ETag") is not None:
+        return request_headers["If-None-Match"] == response_headers["ETag"]
+    if "If-Modified-Since" in request_headers and response_headers.get("Last-Modified") is not None:
+        return request_headers["If-Modified-Since"] == response_headers["Last-Modified"]
+    return False
+
+class Cassette:
+    """
+    A folder of recorded HTTP responses, keyed by method and URL.
+    The index is appended to as responses are recorded, with later entries replacing earlier ones, and bodies are stored in separate files named by their digest.
+    Bodies are stored as sent, without undoing any content encoding.
+    """
+    def __init__(self, path):
+        self.path = Path(path)
+        self.lock = threading.Lock()
+        self.entries = {}
+        index_path = self.path / CASSETTE_INDEX_NAME
+        if index_path.exists():
+            with open(index_path) as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.entries[(entry["method"], entry["url"])] = entry
+
+    def get(self, method, url):
+        """
+        Get the recorded status, headers and body of a request, or `None` if it hasn't been recorded.
+        """
+        entry = self.entries.get((method, url))
+        if entry is None:
+            return None
+        body = b"" if entry["body"] is None else (self.path / CASSETTE_BODIES_FOLDER_NAME / entry["body"]).read_bytes()
+        return (entry["status"], entry["headers"], body)
+
+    def record(self, method, url, status, headers, body):
+        body_name = None
+        with self.lock:
+            if body:
+                body_name = hashlib.sha256(body).hexdigest()
+                body_path = self.path / CASSETTE_BODIES_FOLDER_NAME / body_name
+                body_path.parent.mkdir(parents=True, exist_ok=True)
+                if not body_path.exists():
+                    body_path.write_bytes(body)
+            entry = {"method": method, "url": url, "status": status, "headers": headers, "body": body_name}
+            self.path.mkdir(parents=True, exist_ok=True)
+            with open(self.path / CASSETTE_INDEX_NAME, "a") as f:
+                f.write(json.dumps(entry) + "\n")
+            self.entries[(method, url)] = entry
+
+class RedirectingAdapter(HTTPAdapter):
+    """
+    Sends requests as usual, or to the redirect server if a redirect URL is given.
+    """
+    def __init__(self, redirect_url=None, **kwargs):
+        self.redirect_url = redirect_url
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        if self.redirect_url is not None:
+            request = request.copy()
+            request.url = get_redirected_url(request.url, self.redirect_url)
+        return super().send(request, **kwargs)
+
+class ReplayAdapter(HTTPAdapter):
+    """
+    Answers requests from a cassette, responding to conditional requests with 304 if the recorded response's validators match.
+    """
+    def __init__(self, cassette, **kwargs):
+        self.cassette = cassette
+        super().__init__(**kwargs)
+
+    def build_recorded_response(self, request, recorded):
+        status, headers, body = recorded
+        if status == 200 and is_not_modified(request.headers, CaseInsensitiveDict(headers)):
+            status = 304
+            headers = {name: value for name, value in headers.items() if name.lower() in ("etag", "last-modified")}
+            body = b""
+        raw = HTTPResponse(
+            body=io.BytesIO(body), headers=headers, status=status, preload_content=False, decode_content=False, request_method=request.method
+        )
+        return self.build_response(request, raw)
+
+    def send(self, request, **kwargs):
+        recorded = self.cassette.get(request.method, request.url)
+        if recorded is None:
+            raise requests.ConnectionError(f"No response to {request.method} {request.url} is recorded in {self.cassette.path}", request=request)
+        return self.build_recorded_response(request, recorded)
+
+class RecordingAdapter(ReplayAdapter):
+    """
+    Sends requests using the given adapter and records their responses to a cassette, then answers them from the recording.
+    Conditional headers are left out of the requests that are sent, so that full responses are recorded.
+    """
+    def __init__(self, cassette, live_adapter, **kwargs):
+        self.live_adapter = live_adapter
+        super().__init__(cassette, **kwargs)
+
+    def send(self, request, **kwargs):
+        live_request = request.copy()
+        for name in CONDITIONAL_HEADERS:
+            live_request.headers.pop(name, None)
+        response = self.live_adapter.send(live_request, **{**kwargs, "stream": True})
+        try:
+            body = response.raw.read(decode_content=False)
+        finally:
+            response.close()
+        headers = dict(response.raw.headers)
+        self.cassette.record(request.method, request.url, response.status_code, headers, body)
+        return self.build_recorded_response(request, (response.status_code, headers, body))
+
+    def close(self):
+        self.live_adapter.close()
+        super().close()
+
+@cache
+def get_cassette():
+    return Cassette(HTTP_CASSETTE_PATH)
+
+def make_transport_adapter(pool_size=None):
+    """
+    Create a transport adapter for the configured transport, with a connection pool that can hold `pool_size` keep-alive connections.
+    """
+    pool_kwargs = {} if pool_size is None else {"pool_connections": pool_size, "pool_maxsize": pool_size}
+    match HTTP_TRANSPORT:
+        case "live":
+            return RedirectingAdapter(HTTP_REDIRECT_URL, **pool_kwargs)
+        case "record":
+            return RecordingAdapter(get_cassette(), RedirectingAdapter(HTTP_REDIRECT_URL, **pool_kwargs))
+        case "replay":
+            return ReplayAdapter(get_cassette())
+        case transport:
+            raise ValueError(f"Unknown HTTP transport {transport}")
+
+def make_session(pool_size=None):
+    """
+    Create a session that sends requests using the configured transport.
+    """
+    session = requests.Session()
+    adapter = make_transport_adapter(pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+@cache
+def get_default_session():
+    return make_session()
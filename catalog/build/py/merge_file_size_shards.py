@@ -0,0 +1,72 @@
+import glob
+import json
+import os
+import re
+from dataclasses import asdict
+import pandas as pd
+from build_help import SPEC_DRY_RUN, get_file_size_shard_path, get_file_size_url
+from reports import UriError, generate_catalog_report
+import build_sequencing_data
+import build_assemblies
+import build_annotations
+
+# Entity type name, intermediate file path, report path, and URI column of each entity type whose file sizes may be sharded
+SHARDED_ENTITY_TYPES = [
+    ("sequencing data", build_sequencing_data.OUTPUT_FILE_PATH, build_sequencing_data.REPORT_PATH, "path"),
+    ("assembly", build_assemblies.OUTPUT_FILE_PATH, build_assemblies.REPORT_PATH, "assembly"),
+    ("annotation", build_annotations.OUTPUT_FILE_PATH, build_annotations.REPORT_PATH, "location"),
+]
+
+
+def load_shard_tables(entity_type_name):
+    """
+    Load and combine all of the partial file size tables for an entity type, checking that the full set of shards is present.
+    Where tables overlap, the newest entry for each URL is used: the last in its table, with tables ordered by modification time and then by path.
+    """
+    paths = sorted(glob.glob(get_file_size_shard_path(entity_type_name, "*", "*")), key=lambda path: (os.path.getmtime(path), path))
+    if not paths:
+        return None
+    shard_ids = {tuple(int(n) for n in re.search(r"shard-(\d+)-of-(\d+)\.csv$", path).groups()) for path in paths}
+    shard_counts = {count for _, count in shard_ids}
+    if len(shard_counts) > 1:
+        raise RuntimeError(f"Found {entity_type_name} file size shards from runs with different shard counts: {sorted(shard_counts)}")
+    shard_count = shard_counts.pop()
+    missing_shards = [index for index in range(shard_count) if (index, shard_count) not in shard_ids]
+    if missing_shards:
+        raise RuntimeError(f"Missing {entity_type_name} file size shards {missing_shards} of {shard_count}")
+    return pd.concat(
+        [pd.read_csv(path, dtype=str, keep_default_na=False) for path in paths],
+        ignore_index=True
+    ).drop_duplicates("url", keep="last").set_index("url")
+
+
+def merge_file_size_shards():
+    for entity_type_name, output_file_path, report_path, uri_column in SHARDED_ENTITY_TYPES:
+        shard_table = load_shard_tables(entity_type_name)
+        if shard_table is None:
+            print(f"No {entity_type_name} file size shards found")
+            continue
+        if SPEC_DRY_RUN:
+            print(f"Would merge {len(shard_table)} {entity_type_name} file sizes from shards into {output_file_path}")
+            continue
+        df = pd.read_csv(output_file_path, dtype=str, keep_default_na=False)
+        urls = df[uri_column].map(get_file_size_url)
+        missing_urls = urls[~urls.isin(shard_table.index)]
+        if len(missing_urls):
+            raise RuntimeError(f"{len(missing_urls)} {entity_type_name} files are not in any shard, e.g. {missing_urls.iloc[0]}; were the shards built from a different catalog?")
+        df["file_size"] = shard_table["file_size"].reindex(urls).to_numpy()
+        error_messages = shard_table["error_message"].reindex(urls)
+        uri_errors = [UriError(url, message) for url, message in error_messages.items() if message]
+        # Update the report's URI errors, in the same order as they'd be reported by an unsharded build
+        with open(report_path) as f:
+            report = json.load(f)
+        report["file_uri_errors"] = [asdict(error) for error in uri_errors]
+        with open(report_path, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        df.to_csv(output_file_path, index=False)
+        print(f"Merged {entity_type_name} file sizes ({len(uri_errors)} errors)")
+
+
+if __name__ == "__main__":
+    merge_file_size_shards()
+    generate_catalog_report()
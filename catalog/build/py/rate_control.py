@@ -0,0 +1,131 @@
+import threading
+import time
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+THROTTLING_STATUS_CODES = {429, 503}
+
+# Number of concurrent requests initially allowed per host
+INITIAL_HOST_CONCURRENCY = 4
+# Seconds to pause requests to a throttling host that doesn't send `Retry-After`
+DEFAULT_RETRY_AFTER = 1.0
+# Number of times a throttled request is retried before its response is returned as-is
+MAX_THROTTLING_RETRIES = 5
+
+@dataclass
+class HostState:
+    limit: float
+    active: int = 0
+    paused_until: float = 0.0
+    issued: int = 0
+    last_cut_issued: int = 0
+    requests: int = 0
+    throttled: int = 0
+    started_at: float | None = None
+    finished_at: float | None = None
+
+def parse_retry_after(value):
+    """
+    Get the number of seconds to wait from a `Retry-After` header value, which may be either a number of seconds or an HTTP date.
+    """
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+class HostRateController:
+    """
+    Limits the number of concurrent requests to each host using additive-increase/multiplicative-decrease:
+    the limit grows by one per limit's worth of healthy responses, and is halved when the host throttles requests that were sent since the last cut.
+    Throttled requests are retried after the host's `Retry-After` delay, during which no requests are sent to the host.
+    """
+    def __init__(self, max_concurrency, initial_concurrency=INITIAL_HOST_CONCURRENCY):
+        self.max_concurrency = max_concurrency
+        self.initial_concurrency = min(initial_concurrency, max_concurrency)
+        self.condition = threading.Condition()
+        self.hosts = {}
+
+    def acquire(self, host):
+        with self.condition:
+            state = self.hosts.setdefault(host, HostState(self.initial_concurrency))
+            while True:
+                wait_time = state.paused_until - time.time()
+                if wait_time <= 0 and state.active < int(state.limit):
+                    break
+                self.condition.wait(wait_time if wait_time > 0 else None)
+            state.active += 1
+            state.issued += 1
+            if state.started_at is None:
+                state.started_at = time.time()
+            return state.issued
+
+    def release(self, host, ticket, status_code=None, retry_after=None):
+        with self.condition:
+            state = self.hosts[host]
+            state.active -= 1
+            state.requests += 1
+            state.finished_at = time.time()
+            if status_code in THROTTLING_STATUS_CODES:
+                state.throttled += 1
+                # Only cut once for the requests that were in flight when throttling started
+                if ticket > state.last_cut_issued:
+                    state.limit = max(1.0, state.limit / 2)
+                    state.last_cut_issued = state.issued
+                state.paused_until = max(state.paused_until, time.time() + (DEFAULT_RETRY_AFTER if retry_after is None else retry_after))
+            elif status_code is not None:
+                state.limit = min(float(self.max_concurrency), state.limit + 1 / state.limit)
+            self.condition.notify_all()
+
+    def send(self, url, send_request):
+        """
+        Send a request to the given URL using the `send_request` function, retrying it if it's throttled.
+        """
+        host = urlparse(url).netloc
+        for attempt in range(MAX_THROTTLING_RETRIES + 1):
+            ticket = self.acquire(host)
+            try:
+                response = send_request()
+            except Exception:
+                self.release(host, ticket)
+                raise
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            self.release(host, ticket, response.status_code, retry_after)
+            if response.status_code not in THROTTLING_STATUS_CODES:
+                break
+        return response
+
+    def get_host_stats(self):
+        """
+        Get a dict mapping each host to its request counts, final concurrency limit, and effective request rate.
+        """
+        with self.condition:
+            return {
+                host: {
+                    "requests": state.requests,
+                    "throttled_requests": state.throttled,
+                    "concurrency_limit": int(state.limit),
+                    "requests_per_second": round(state.requests / max(state.finished_at - state.started_at, 1e-3), 2) if state.requests else 0
+                }
+                for host, state in self.hosts.items()
+            }
+
+class RateControlledSession:
+    """
+    Wraps a session so that its GET and HEAD requests are scheduled by a `HostRateController`.
+    """
+    def __init__(self, session, controller):
+        self.session = session
+        self.controller = controller
+
+    def get(self, url, **kwargs):
+        return self.controller.send(url, lambda: self.session.get(url, **kwargs))
+
+    def head(self, url, **kwargs):
+        return self.controller.send(url, lambda: self.session.head(url, **kwargs))
@@ -1,7 +1,13 @@
 from dataclasses import dataclass, asdict
 import json
+import os
 import subprocess
-from build_help import get_file_error_strings
+from build_help import SPEC_DRY_RUN, get_file_error_strings
+
+# Folder of the statistics of each build's latest run, which vary between runs, so are kept out of the report data
+RUN_STATS_FOLDER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../temporary/run_stats")
+# Fields of `EntityTypeReport` that are saved in the run statistics rather than in the report data
+RUN_STATS_FIELDS = ("file_size_stats", "parse_stats")
 
 @dataclass
 class InputFileErrors:
@@ -17,9 +23,19 @@ class UriError:
 class EntityTypeReport:
     validation_errors: list[InputFileErrors]
     file_uri_errors: list[UriError] | None = None
+    file_size_stats: dict | None = None
+    parse_stats: dict | None = None
     def save_to(self, file_path):
+        report = asdict(self)
+        run_stats = {name: report.pop(name) for name in RUN_STATS_FIELDS}
         with open(file_path, "w") as f:
-            json.dump(asdict(self), f, indent=2, sort_keys=True)
+            json.dump(report, f, indent=2, sort_keys=True)
+        if any(value is not None for value in run_stats.values()):
+            os.makedirs(RUN_STATS_FOLDER_PATH, exist_ok=True)
+            run_stats_path = os.path.join(RUN_STATS_FOLDER_PATH, os.path.basename(file_path))
+            with open(run_stats_path, "w") as f:
+                json.dump(run_stats, f, indent=2, sort_keys=True)
+            print(f"Saved run statistics to {run_stats_path}")
 
 def get_error_strings_for_file(filename, errors):
     return InputFileErrors(filename, get_file_error_strings(errors))
@@ -34,4 +50,7 @@ def make_uri_error_accumulator():
     return handle_error, errors
 
 def generate_catalog_report():
+    if SPEC_DRY_RUN:
+        print("Not generating the catalog report in a dry run")
+        return
     subprocess.run(["npm", "run", "generate-catalog-report"], check=True)
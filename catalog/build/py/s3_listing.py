@@ -0,0 +1,67 @@
+import os
+import posixpath
+import xml.etree.ElementTree as ET
+from collections import defaultdict
+from datetime import datetime
+from email.utils import format_datetime
+from urllib.parse import quote as url_quote, unquote as url_unquote
+
+# Base URL of an S3-compatible endpoint to use instead of AWS, e.g. a local stand-in such as `http://localhost:9000`; buckets are addressed path-style
+S3_ENDPOINT = os.environ.get("HPRC_S3_ENDPOINT")
+
+S3_XML_NAMESPACE = {"s3": "http://s3.amazonaws.com/doc/2006-03-01/"}
+
+def parse_s3_uri(uri):
+    """
+    Split an S3 URI into its bucket and (decoded) key.
+    """
+    bucket, _, key = uri[5:].partition("/")  # Remove `s3://` and split to extract bucket and key
+    return (bucket, url_unquote(key))
+
+def get_s3_bucket_url(bucket):
+    return f"{S3_ENDPOINT.rstrip("/")}/{bucket}" if S3_ENDPOINT else f"https://{bucket}.s3.amazonaws.com"
+
+def get_s3_object_url(uri):
+    """
+    Convert an S3 URI to an HTTPS URL.
+    """
+    bucket, *key_parts = uri[5:].split("/")  # Remove `s3://` and split to extract bucket and key
+    # Ensure that characters such as `+`, which may not already be URL-encoded, are encoded properly
+    key_parts = [url_quote(url_unquote(part), safe="") for part in key_parts]
+    return f"{get_s3_bucket_url(bucket)}/{"/".join(key_parts)}"
+
+def group_s3_uris_by_prefix(uris):
+    """
+    Group S3 URIs by bucket and directory, and get the longest common key prefix of each group.
+    Returns a list of tuples of bucket, prefix, and a dict mapping keys to the URIs in the group.
+    """
+    groups = defaultdict(dict)
+    for uri in uris:
+        bucket, key = parse_s3_uri(uri)
+        groups[(bucket, posixpath.dirname(key))][key] = uri
+    return [(bucket, posixpath.commonprefix(list(uris_by_key)), uris_by_key) for (bucket, _), uris_by_key in groups.items()]
+
+def format_http_date(iso_date):
+    return format_datetime(datetime.fromisoformat(iso_date.replace("Z", "+00:00")), usegmt=True)
+
+def list_s3_objects(session, bucket, prefix):
+    """
+    List the objects directly under the given prefix using anonymous ListObjectsV2 requests, following continuation tokens.
+    Returns a dict mapping keys to tuples of size, ETag, and Last-Modified date.
+    """
+    objects = {}
+    params = {"list-type": "2", "prefix": prefix, "delimiter": "/", "max-keys": "1000"}
+    while True:
+        response = session.get(get_s3_bucket_url(bucket) + "/", params=params, timeout=30)
+        if response.status_code != 200:
+            raise RuntimeError(f"Listing s3://{bucket}/{prefix} received {response.status_code} response")
+        root = ET.fromstring(response.content)
+        for item in root.iterfind("s3:Contents", S3_XML_NAMESPACE):
+            objects[item.findtext("s3:Key", namespaces=S3_XML_NAMESPACE)] = (
+                int(item.findtext("s3:Size", namespaces=S3_XML_NAMESPACE)),
+                item.findtext("s3:ETag", namespaces=S3_XML_NAMESPACE),
+                format_http_date(item.findtext("s3:LastModified", namespaces=S3_XML_NAMESPACE))
+            )
+        if root.findtext("s3:IsTruncated", namespaces=S3_XML_NAMESPACE) != "true":
+            return objects
+        params = {**params, "continuation-token": root.findtext("s3:NextContinuationToken", namespaces=S3_XML_NAMESPACE)}
@@ -0,0 +1,198 @@
+import functools
+import hashlib
+import importlib.metadata
+import math
+import os
+import pickle
+import re
+import sys
+import types
+from dataclasses import fields, is_dataclass
+from pathlib import Path
+import pandas as pd
+from linkml_runtime import SchemaView
+from downloads import write_file_atomically
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Whether the outputs of specs marked with `"materialize": True` are saved, and reused by later builds while their fingerprints are unchanged
+SPEC_MATERIALIZE = os.environ.get("HPRC_SPEC_MATERIALIZE", "1") not in ("", "0")
+SPEC_MATERIALIZATIONS_FOLDER_PATH = os.path.join(BASE_DIR, "../temporary/spec_materializations")
+
+# Version of the format of saved outputs, to be incremented when it changes
+MATERIALIZATION_FORMAT_VERSION = 1
+# Packages whose versions are part of each fingerprint, as they may affect how sources are parsed and validated
+FINGERPRINTED_PACKAGES = ("pandas", "numpy", "pydantic", "linkml-runtime", "pyarrow")
+
+OUTPUT_PARQUET_NAME = "output.parquet"
+OUTPUT_PICKLE_NAME = "output.pickle"
+# Written last, so that its presence indicates that the output is complete
+METADATA_NAME = "metadata.pickle"
+
+class UnfingerprintableError(Exception):
+    pass
+
+@functools.cache
+def get_file_sha256(path):
+    return hashlib.sha256(Path(path).read_bytes()).hexdigest()
+
+def get_package_version(name):
+    try:
+        return importlib.metadata.version(name)
+    except importlib.metadata.PackageNotFoundError:
+        return None
+
+def get_local_module_file(module_name):
+    """
+    Get the source file of a module of the build, or `None` if the module is from a library.
+    """
+    module_file = getattr(sys.modules.get(module_name), "__file__", None)
+    return module_file if module_file is not None and os.path.abspath(module_file).startswith(BASE_DIR + os.sep) else None
+
+def get_code_global_names(code):
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            names |= get_code_global_names(const)
+    return names
+
+class Fingerprinter:
+    """
+    Computes a digest of a spec, which changes when anything that may affect the spec's output changes:
+    its values, the source files of the build modules that define its functions and of the models and schemas they use, the values captured by its functions,
+    and the functions, data, models and schemas that they refer to, recursively.
+    Values of other types can't be fingerprinted, as it can't be determined whether they've changed.
+    """
+    def __init__(self):
+        self.digest = hashlib.sha256()
+        self.seen_ids = set()
+
+    def write(self, *parts):
+        for part in parts:
+            self.digest.update(f"{part}\0".encode())
+
+    def add(self, value):
+        if value is None or isinstance(value, (bool, int, str, bytes)):
+            self.write(type(value).__name__, repr(value))
+        elif isinstance(value, float):
+            self.write("float", "nan" if math.isnan(value) else repr(value))
+        elif isinstance(value, (list, tuple)):
+            self.write(type(value).__name__, len(value))
+            for item in value:
+                self.add(item)
+        elif isinstance(value, (set, frozenset)):
+            self.add(sorted(value, key=repr))
+        elif isinstance(value, dict):
+            self.write("dict", len(value))
+            for key, item in value.items():
+                self.add(key)
+                self.add(item)
+        elif isinstance(value, types.ModuleType):
+            self.write("module", value.__name__)
+        elif id(value) in self.seen_ids:
+            self.write("seen", getattr(value, "__qualname__", type(value).__qualname__))
+        else:
+            self.seen_ids.add(id(value))
+            self.add_object(value)
+
+    def add_object(self, value):
+        if isinstance(value, types.FunctionType):
+            self.add_function(value)
+        elif isinstance(value, functools.partial):
+            self.write("partial")
+            self.add([value.func, value.args, value.keywords])
+        elif isinstance(value, type):
+            module_file = get_local_module_file(value.__module__)
+            self.write("type", value.__module__, value.__qualname__, module_file and get_file_sha256(module_file))
+        elif isinstance(value, re.Pattern):
+            self.write("pattern", value.flags)
+            self.add(value.pattern)
+        elif isinstance(value, SchemaView):
+            self.write("schemaview", get_file_sha256(value.schema.source_file))
+        elif callable(value) and hasattr(value, "__wrapped__"):
+            # Functions wrapped by decorators such as `functools.cache` are identified by the functions they wrap
+            self.write("wrapped", type(value).__module__, type(value).__qualname__)
+            self.add(value.__wrapped__)
+        elif isinstance(value, (types.BuiltinFunctionType, types.MethodType)) or callable(value) and get_local_module_file(type(value).__module__) is None:
+            # Library functions are identified by name, along with the package versions
+            self.write("callable", getattr(value, "__module__", None), getattr(value, "__qualname__", repr(value)))
+        elif is_dataclass(value):
+            self.write("dataclass", type(value).__qualname__)
+            self.add({field.name: getattr(value, field.name) for field in fields(value)})
+        else:
+            raise UnfingerprintableError(f"Can't fingerprint {type(value).__qualname__} value {value!r}")
+
+    def add_function(self, function):
+        code = function.__code__
+        module_file = get_local_module_file(function.__module__)
+        self.write("function", function.__module__, function.__qualname__, code.co_firstlineno, module_file and get_file_sha256(module_file))
+        if module_file is None:
+            return
+        self.add([cell.cell_contents for cell in function.__closure__ or ()])
+        self.add([function.__defaults__, function.__kwdefaults__])
+        self.add({name: function.__globals__[name] for name in sorted(get_code_global_names(code)) if name in function.__globals__})
+
+def get_spec_fingerprint(spec, source_digests, options=None):
+    """
+    Get a fingerprint of the output of a spec, from the spec, the digests of its source files, and any build options that affect it,
+    or `None` if the spec contains values that can't be fingerprinted.
+    """
+    fingerprinter = Fingerprinter()
+    try:
+        fingerprinter.add([
+            MATERIALIZATION_FORMAT_VERSION,
+            {name: get_package_version(name) for name in FINGERPRINTED_PACKAGES},
+            options,
+            source_digests,
+            spec,
+        ])
+    except UnfingerprintableError as ex:
+        # Without a fingerprint, the spec's sources are loaded and validated in full on every build, so this is reported prominently
+        print(
+            f"WARNING: Not materializing spec output, as it can't be fingerprinted: {ex}\n"
+            "WARNING: Its sources will be loaded and validated in full on every build; set HPRC_SPEC_MATERIALIZE=0 to disable materialization",
+            file=sys.stderr
+        )
+        return None
+    return fingerprinter.digest.hexdigest()
+
+def get_materialization_path(fingerprint):
+    return Path(SPEC_MATERIALIZATIONS_FOLDER_PATH, fingerprint)
+
+def load_materialized_output(fingerprint):
+    """
+    Load a saved tuple of dataframe, metadata and context, or return `None` if there's no complete output saved with the given fingerprint.
+    """
+    path = get_materialization_path(fingerprint)
+    if not (path / METADATA_NAME).exists():
+        return None
+    with open(path / METADATA_NAME, "rb") as f:
+        metadata, context = pickle.load(f)
+    if (path / OUTPUT_PARQUET_NAME).exists():
+        df = pd.read_parquet(path / OUTPUT_PARQUET_NAME)
+    else:
+        df = pd.read_pickle(path / OUTPUT_PICKLE_NAME)
+    return (df, metadata, context)
+
+def save_materialized_output(fingerprint, output):
+    """
+    Save a tuple of dataframe, metadata and context under the given fingerprint.
+    The dataframe is saved as Parquet if it can be read back unchanged, which requires the `pyarrow` package, and is otherwise pickled, as is the metadata.
+    """
+    df, metadata, context = output
+    path = get_materialization_path(fingerprint)
+    path.mkdir(parents=True, exist_ok=True)
+    try:
+        write_file_atomically(path / OUTPUT_PARQUET_NAME, lambda f: df.to_parquet(f))
+        saved_df = pd.read_parquet(path / OUTPUT_PARQUET_NAME)
+        is_parquet_unchanged = saved_df.equals(df) and saved_df.dtypes.equals(df.dtypes) and saved_df.index.equals(df.index)
+    except (ImportError, ValueError, TypeError) as ex:
+        print(f"Can't save spec output as Parquet ({ex}); pickling it instead")
+        is_parquet_unchanged = False
+    if not is_parquet_unchanged:
+        (path / OUTPUT_PARQUET_NAME).unlink(missing_ok=True)
+        write_file_atomically(path / OUTPUT_PICKLE_NAME, lambda f: pickle.dump(df, f))
+    try:
+        write_file_atomically(path / METADATA_NAME, lambda f: pickle.dump((metadata, context), f))
+    except (pickle.PicklingError, TypeError, AttributeError) as ex:
+        print(f"Not materializing spec output, as its metadata can't be pickled ({ex})")
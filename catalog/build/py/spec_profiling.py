@@ -0,0 +1,81 @@
+import json
+import os
+import time
+from dataclasses import dataclass, field, asdict
+
+@dataclass
+class StepProfile:
+    name: str
+    seconds: float
+    rows_in: int | None = None
+    rows_out: int | None = None
+    columns_out: int | None = None
+    memory_delta: int | None = None
+
+@dataclass
+class SpecProfile:
+    """
+    Timings and dataframe sizes of the steps of loading a spec, and of the specs and URLs it's sourced from.
+    """
+    name: str
+    steps: list[StepProfile] = field(default_factory=list)
+    children: list["SpecProfile"] = field(default_factory=list)
+
+    def add_child(self, name):
+        child = SpecProfile(name)
+        self.children.append(child)
+        return child
+
+    def get_total_seconds(self):
+        """
+        Get the time taken by this spec's steps and by all of its sources' steps, which may have overlapped.
+        """
+        return sum(step.seconds for step in self.steps) + sum(child.get_total_seconds() for child in self.children)
+
+    def format_tree(self, indent=0):
+        lines = [f"{'  ' * indent}{self.name} ({self.get_total_seconds():.3f}s total)"]
+        for child in self.children:
+            lines.append(child.format_tree(indent + 1))
+        for step in self.steps:
+            lines.append(f"{'  ' * (indent + 1)}{format_step(step)}")
+        return "\n".join(lines)
+
+def format_step(step):
+    text = f"{step.name}: {step.seconds:.3f}s"
+    if step.rows_out is not None:
+        text += f", rows {'' if step.rows_in is None else f'{step.rows_in} -> '}{step.rows_out}, {step.columns_out} columns"
+    if step.memory_delta is not None:
+        text += f", memory {step.memory_delta / 1e6:+.2f} MB"
+    return text
+
+def get_df_memory(df):
+    return int(df.memory_usage(deep=True).sum())
+
+def run_profiled_step(profile, name, run, df_in=None, get_df_out=lambda result: result):
+    """
+    Call `run`, and, if a profile is given, record the time it took, and the rows, columns and memory use of its output dataframe relative to `df_in`.
+    `get_df_out` gets the output dataframe from the result, or `None` if there isn't one.
+    """
+    if profile is None:
+        return run()
+    start_time = time.perf_counter()
+    result = run()
+    seconds = time.perf_counter() - start_time
+    df_out = get_df_out(result)
+    step = StepProfile(name, seconds)
+    if df_out is not None:
+        step.rows_in = None if df_in is None else len(df_in)
+        step.rows_out = len(df_out)
+        step.columns_out = len(df_out.columns)
+        step.memory_delta = get_df_memory(df_out) - (0 if df_in is None else get_df_memory(df_in))
+    profile.steps.append(step)
+    return result
+
+def save_spec_profile(profile, folder_path):
+    """
+    Print a profile as a tree, and save it as JSON in the given folder.
+    """
+    print(f"\nSpec profile:\n{profile.format_tree()}\n")
+    os.makedirs(folder_path, exist_ok=True)
+    with open(os.path.join(folder_path, f"{profile.name}.json"), "w") as f:
+        json.dump(asdict(profile), f, indent=2)
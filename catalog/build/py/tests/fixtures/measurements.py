@@ -0,0 +1,81 @@
+# Model of `measurements.yaml`, in the form generated by `gen-pydantic`, without the LinkML metadata
+
+from __future__ import annotations 
+
+import re
+from enum import Enum 
+from typing import Optional
+
+from pydantic import (
+    BaseModel,
+    ConfigDict,
+    Field,
+    field_validator
+)
+
+
+class ConfiguredBaseModel(BaseModel):
+    model_config = ConfigDict(
+        validate_assignment = True,
+        validate_default = True,
+        extra = "ignore",
+        arbitrary_types_allowed = True,
+        use_enum_values = True,
+        strict = False,
+    )
+    pass
+
+
+class Platform(str, Enum):
+    ILLUMINA = "ILLUMINA"
+    PACBIO_SMRT = "PACBIO_SMRT"
+    OXFORD_NANOPORE = "OXFORD_NANOPORE"
+
+
+class Measurement(ConfiguredBaseModel):
+    """
+    A measurement.
+    """
+    sample_id: str = Field(default=..., description="""Sample ID.""")
+    platform: Platform = Field(default=..., description="""Sequencing platform.""")
+    haplotype: int = Field(default=..., description="""Haplotype.""", ge=0, le=2)
+    coverage: Optional[float] = Field(default=None, description="""Coverage.""", ge=0, le=100)
+    is_phased: Optional[bool] = Field(default=None, description="""Whether the measurement is phased.""")
+    notes: Optional[str] = Field(default=None, description="""Notes.""")
+
+    @field_validator('sample_id')
+    def pattern_sample_id(cls, v):
+        pattern=re.compile(r"^(?:NA|HG)\d{3}(?:\d{2})?$")
+        if isinstance(v,list):
+            for element in v:
+                if isinstance(v, str) and not pattern.match(element):
+                    raise ValueError(f"Invalid sample_id format: {element}")
+        elif isinstance(v,str):
+            if not pattern.match(v):
+                raise ValueError(f"Invalid sample_id format: {v}")
+        return v
+
+
+class ReleaseOneMeasurement(ConfiguredBaseModel):
+    """
+    A measurement using the legacy Release 1 fields.
+    """
+    sample_id: str = Field(default=..., description="""Sample ID.""")
+    coverage: Optional[float] = Field(default=None, description="""Coverage.""", ge=0, le=100)
+    notes: Optional[str] = Field(default=None, description="""Notes.""")
+
+    @field_validator('sample_id')
+    def pattern_sample_id(cls, v):
+        pattern=re.compile(r"^(?:NA|HG)\d{3}(?:\d{2})?$")
+        if isinstance(v,list):
+            for element in v:
+                if isinstance(v, str) and not pattern.match(element):
+                    raise ValueError(f"Invalid sample_id format: {element}")
+        elif isinstance(v,str):
+            if not pattern.match(v):
+                raise ValueError(f"Invalid sample_id format: {v}")
+        return v
+
+
+Measurement.model_rebuild()
+ReleaseOneMeasurement.model_rebuild()
@@ -0,0 +1,45 @@
+import pandas as pd
+from pydantic import ValidationError
+from build_help import HprcFieldValidationError, get_field_type_mappers, get_pydantic_field_names
+
+# Validation of a dataframe one row at a time, as it was done before rows were cast column-wise and validated in batches, used as the reference that the batch validation is compared with
+
+
+def cast_row(source_row_dict, row_index, field_type_mappers):
+    return {
+        k: None if v == "" else field_type_mappers[k](v, row_index, k) if k in field_type_mappers else v
+        for k, v in source_row_dict.items()
+    }
+
+def get_non_applicable_slot_errors(source_row_dict, row_index, model, schemaview):
+    # Slots whose values are empty aren't reported, as in the batch validation
+    model_field_names = get_pydantic_field_names(model)
+    return [
+        HprcFieldValidationError("Specified slot is in the broader model but not the specific class", row_index, name)
+        for name in schemaview.all_slots().keys()
+        if name in source_row_dict and name not in model_field_names and source_row_dict[name] != "" and not pd.isna(source_row_dict[name])
+    ]
+
+def validate_row(source_row_dict, row_index, field_type_mappers, model, schemaview):
+    errors = get_non_applicable_slot_errors(source_row_dict, row_index, model, schemaview)
+    try:
+        row_dict = cast_row(source_row_dict, row_index, field_type_mappers)
+    except HprcFieldValidationError as err:
+        return errors + [err]
+    try:
+        model.model_validate(row_dict)
+    except ValidationError as err:
+        errors += [HprcFieldValidationError(e["msg"], row_index, e["loc"][0]) for e in err.errors()]
+    return errors
+
+def get_per_row_validation_errors(df, model, schemaview, row_offset=0):
+    """
+    Validate each row of a dataframe with Pydantic, returning the errors as tuples of their message, row and field.
+    """
+    field_type_mappers = get_field_type_mappers(schemaview, model)
+    rows = df.astype(object).to_dict(orient="records")
+    return [
+        (err.message, err.row, err.field)
+        for i, row in enumerate(rows)
+        for err in validate_row(row, row_offset + i + 2, field_type_mappers, model, schemaview)
+    ]
@@ -0,0 +1,42 @@
+import threading
+from contextlib import contextmanager
+from http.server import ThreadingHTTPServer
+from unittest import mock
+import http_stub_server
+import http_transport
+from http_stub_server import StubRequestHandler
+from http_transport import get_original_url
+
+
+class RecordingStubRequestHandler(StubRequestHandler):
+    """
+    Answers requests as the stub server does, recording the method and original URL of each request on the server.
+    """
+    def answer(self):
+        with self.server.requests_lock:
+            self.server.requests.append((self.command, get_original_url(self.path)))
+        super().answer()
+
+
+@contextmanager
+def serve_stub(cassette):
+    """
+    Run the stub server on a free port, answering requests from the given cassette, and redirect the requests of sessions made by `http_transport.make_session` to it.
+    Yields the list of requests received by the server, as tuples of method and original URL.
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", 0), RecordingStubRequestHandler)
+    server.requests = []
+    server.requests_lock = threading.Lock()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        with (
+            mock.patch.object(http_stub_server, "get_cassette", lambda: cassette),
+            mock.patch.object(http_transport, "HTTP_TRANSPORT", "live"),
+            mock.patch.object(http_transport, "HTTP_REDIRECT_URL", f"http://127.0.0.1:{server.server_address[1]}")
+        ):
+            yield server.requests
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
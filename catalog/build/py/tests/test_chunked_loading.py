@@ -0,0 +1,43 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+import pandas as pd
+import build_help
+from downloads import DownloadInfo
+
+SOURCE_CSV = "sample_id,haplotype,location\nHG00097,1,s3://bucket/HG00097.hap1.bam\nHG00097,2,s3://bucket/HG00097.hap2.bam\nHG00099,1,s3://bucket/HG00099.hap1.bam\n"
+
+
+class TestChunkedLoading(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.folder.name, "source.csv")
+        with open(self.path, "w") as f:
+            f.write(SOURCE_CSV)
+        info = DownloadInfo(url="https://example.org/source.csv", filename="source.csv", sha256="", bytes=len(SOURCE_CSV), seconds=0, downloaded_at=0)
+        patcher = mock.patch.object(build_help, "download_file_with_info", return_value=(self.path, info))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.folder.cleanup)
+
+    def load_chunks(self, spec):
+        return [chunk for chunk, _, _ in build_help.iter_url_source_chunks(spec, "https://example.org/source.csv", self.folder.name, 2)]
+
+    def test_chunks_are_read_as_strings(self):
+        chunks = self.load_chunks({"sep": ","})
+        self.assertEqual([len(chunk) for chunk in chunks], [2, 1])
+        self.assertTrue(all(chunk["haplotype"].map(type).eq(str).all() for chunk in chunks))
+
+    def test_chunks_keep_the_dtype_of_the_read_options(self):
+        chunks = self.load_chunks({"sep": ",", "read_options": {"dtype": {"haplotype": "int64"}}})
+        self.assertTrue(all(chunk["haplotype"].dtype == "int64" for chunk in chunks))
+
+    def test_chunks_match_unchunked_output_without_missing_values(self):
+        unchunked_df = build_help.read_source_csv(self.path, sep=",")
+        chunked_df = pd.concat(self.load_chunks({"sep": ","}), ignore_index=True)
+        self.assertEqual(chunked_df.to_csv(index=False), unchunked_df.to_csv(index=False))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,48 @@
+import os
+import unittest
+import warnings
+import numpy as np
+import pandas as pd
+from linkml_runtime import SchemaView
+from build_help import get_df_validation_errors
+from compiled_validation import compile_model_checks, get_check_failures
+from tests.fixtures.measurements import Measurement
+from tests.per_row_validation import get_per_row_validation_errors
+
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures/measurements.yaml")
+
+
+def get_errors(df, model, schemaview):
+    return [(err.message, err.row, err.field) for err in get_df_validation_errors(df, model, schemaview)]
+
+
+class TestRangeChecks(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.schemaview = SchemaView(SCHEMA_PATH)
+        cls.coverage_check = next(check for check in compile_model_checks(cls.schemaview, Measurement) if check.name == "coverage")
+
+    def test_nan_fails_range_check_without_warnings(self):
+        column = pd.Series(["1", "nan", "120", "", "-1", "100"], dtype=object)
+        for cast_values in (np.array([1.0, np.nan, 120.0, None, -1.0, 100.0], dtype=object), np.array([1.0, np.nan, 120.0, np.nan, -1.0, 100.0])):
+            with warnings.catch_warnings():
+                warnings.simplefilter("error", RuntimeWarning)
+                is_failed = get_check_failures(self.coverage_check, column, cast_values, np.ones(len(column), dtype=bool))
+            self.assertEqual(is_failed.tolist(), [False, True, True, False, True, False])
+
+    def test_nan_and_out_of_range_errors_match_per_row_validation(self):
+        df = pd.DataFrame({
+            "sample_id": ["HG00097", "HG00098", "HG00099", "HG00100", "HG00101"],
+            "platform": ["ILLUMINA"] * 5,
+            "haplotype": ["1", "2", "3", "nan", "0"],
+            "coverage": ["30.5", "nan", "101", "NaN", ""],
+        })
+        with warnings.catch_warnings():
+            warnings.simplefilter("error", RuntimeWarning)
+            errors = get_errors(df, Measurement, self.schemaview)
+        self.assertEqual(errors, get_per_row_validation_errors(df, Measurement, self.schemaview))
+        self.assertEqual([(row, field) for _, row, field in errors], [(3, "coverage"), (4, "haplotype"), (4, "coverage"), (5, "haplotype")])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+import tempfile
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+import http_stub_server
+from hedging import hedge
+from http_transport import Cassette, make_session
+from tests.stub_server import serve_stub
+
+PRIMARY_URL = "https://s3-us-west-2.amazonaws.com/human-pangenomics/HG00097.bam"
+MIRROR_URL = "https://storage.googleapis.com/fc-4310e737/HG00097.bam"
+FAILING_URL = "https://s3-us-west-2.amazonaws.com/human-pangenomics/HG00099.bam"
+
+
+def is_success(response):
+    return response.status_code == 200
+
+
+class TestHedge(unittest.TestCase):
+    def setUp(self):
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        cassette = Cassette(folder.name)
+        cassette.record("HEAD", FAILING_URL, 500, {}, b"")
+        stub = serve_stub(cassette)
+        self.requests = stub.__enter__()
+        self.addCleanup(stub.__exit__, None, None, None)
+        self.session = make_session()
+        self.addCleanup(self.session.close)
+
+    def send(self, url):
+        return lambda: self.session.head(url)
+
+    def test_primary_within_delay_is_not_hedged(self):
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            response, from_mirror = hedge(self.send(PRIMARY_URL), self.send(MIRROR_URL), executor, 5, is_success)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(from_mirror)
+        self.assertEqual(self.requests, [("HEAD", PRIMARY_URL)])
+
+    def test_hedged_request_is_cancelled_when_primary_wins(self):
+        # With a single worker, the hedged request is queued behind the slow primary request, and is cancelled when the primary request succeeds
+        with mock.patch.object(http_stub_server, "STUB_LATENCY", 0.2), ThreadPoolExecutor(max_workers=1) as executor:
+            response, from_mirror = hedge(self.send(PRIMARY_URL), self.send(MIRROR_URL), executor, 0.02, is_success)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(from_mirror)
+        self.assertEqual(self.requests, [("HEAD", PRIMARY_URL)])
+
+    def test_started_hedged_request_is_cross_checked_when_primary_wins(self):
+        cross_checked = threading.Event()
+        checked_responses = []
+        def cross_check(primary_response, mirror_response):
+            checked_responses.extend([primary_response, mirror_response])
+            cross_checked.set()
+        with mock.patch.object(http_stub_server, "STUB_LATENCY", 0.2), ThreadPoolExecutor(max_workers=2) as executor:
+            response, from_mirror = hedge(self.send(PRIMARY_URL), self.send(MIRROR_URL), executor, 0.02, is_success, cross_check)
+            self.assertTrue(cross_checked.wait(5))
+        self.assertFalse(from_mirror)
+        self.assertIs(checked_responses[0], response)
+        self.assertTrue(checked_responses[1].url.endswith("/https/storage.googleapis.com/fc-4310e737/HG00097.bam"))
+        self.assertCountEqual(self.requests, [("HEAD", PRIMARY_URL), ("HEAD", MIRROR_URL)])
+
+    def test_mirror_is_used_when_primary_fails(self):
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            response, from_mirror = hedge(self.send(FAILING_URL), self.send(MIRROR_URL), executor, 5, is_success)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(from_mirror)
+        self.assertEqual(self.requests, [("HEAD", FAILING_URL), ("HEAD", MIRROR_URL)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+import contextlib
+import functools
+import io
+import os
+import tempfile
+import unittest
+from unittest import mock
+import pandas as pd
+import build_help
+import http_stub_server
+from file_size_cache import FileSizeCache
+from http_transport import Cassette
+from merge_file_size_shards import load_shard_tables
+from tests.stub_server import serve_stub
+
+URIS = [f"s3://human-pangenomics/working/HPRC/HG{i:05}/assemblies/HG{i:05}.hap1.fa.gz" for i in range(20)]
+
+
+class TestLoadShardTables(unittest.TestCase):
+    def setUp(self):
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        self.folder_path = folder.name
+        self.shards_folder_path = os.path.join(folder.name, "file_size_shards")
+        stub = serve_stub(Cassette(os.path.join(folder.name, "cassette")))
+        self.requests = stub.__enter__()
+        self.addCleanup(stub.__exit__, None, None, None)
+        patcher = mock.patch.object(build_help, "FILE_SIZE_SHARDS_FOLDER_PATH", self.shards_folder_path)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.build_count = 0
+
+    def build_shard(self, index, count, content_length, uris=URIS, continued=False):
+        """
+        Request the file sizes of a shard from the stub server, which answers with the given content length, as a sharded build does, with an empty file size cache.
+        If `continued` is set, the sizes are appended to the shard's table, as they are by the later chunks of a chunked build.
+        """
+        self.build_count += 1
+        cache_path = os.path.join(self.folder_path, f"file_sizes_{self.build_count}.sqlite")
+        with (
+            mock.patch.object(build_help, "FILE_SIZE_SHARD", f"{index}/{count}"),
+            mock.patch.object(build_help, "written_shard_entity_types", {"assembly"} if continued else set()),
+            mock.patch.object(build_help, "FileSizeCache", functools.partial(FileSizeCache, cache_path)),
+            mock.patch.object(http_stub_server, "STUB_CONTENT_LENGTH", str(content_length)),
+            contextlib.redirect_stdout(io.StringIO())
+        ):
+            build_help.get_file_sizes_from_uris(uris, "assembly", jobs=4)
+        return build_help.get_file_size_shard_path("assembly", index, count)
+
+    def get_shard_urls(self, index, count):
+        return [url for url in map(build_help.get_file_size_url, URIS) if build_help.get_file_size_shard_index(url, count) == index]
+
+    def get_sizes(self):
+        return load_shard_tables("assembly")["file_size"].to_dict()
+
+    def test_shards_are_combined(self):
+        self.build_shard(0, 2, 100)
+        self.build_shard(1, 2, 200)
+        self.assertEqual(len(self.requests), len(URIS))
+        sizes = self.get_sizes()
+        self.assertEqual(sizes, {**{url: "100" for url in self.get_shard_urls(0, 2)}, **{url: "200" for url in self.get_shard_urls(1, 2)}})
+
+    def test_missing_shard_is_an_error(self):
+        self.build_shard(0, 2, 100)
+        with self.assertRaisesRegex(RuntimeError, r"Missing assembly file size shards \[1\] of 2"):
+            load_shard_tables("assembly")
+
+    def test_later_entries_in_a_table_win(self):
+        # A chunked build appends each chunk's sizes to the shard's table
+        self.build_shard(0, 2, 100)
+        self.build_shard(0, 2, 300, URIS[:10], continued=True)
+        self.build_shard(1, 2, 200)
+        sizes = self.get_sizes()
+        for url in self.get_shard_urls(0, 2):
+            self.assertEqual(sizes[url], "300" if url in map(build_help.get_file_size_url, URIS[:10]) else "100")
+
+    def test_newest_table_wins_deterministically(self):
+        first_path = self.build_shard(0, 2, 100)
+        second_path = self.build_shard(1, 2, 200)
+        # An overlapping entry, as in a table rebuilt from a different version of the catalog
+        overlapping_url = self.get_shard_urls(0, 2)[0]
+        pd.DataFrame({"url": [overlapping_url], "file_size": ["999"], "error_message": [""]}).to_csv(second_path, mode="a", header=False, index=False)
+        for first_mtime, second_mtime, expected_size in ((2000, 1000, "100"), (1000, 2000, "999"), (1000, 1000, "999")):
+            with self.subTest(first_mtime=first_mtime, second_mtime=second_mtime):
+                os.utime(first_path, (first_mtime, first_mtime))
+                os.utime(second_path, (second_mtime, second_mtime))
+                tables = [load_shard_tables("assembly") for _ in range(3)]
+                self.assertEqual(tables[0].loc[overlapping_url, "file_size"], expected_size)
+                for table in tables[1:]:
+                    pd.testing.assert_frame_equal(table, tables[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+import tempfile
+import unittest
+from http_transport import Cassette, make_session
+from rate_control import MAX_THROTTLING_RETRIES, HostRateController, RateControlledSession
+from tests.stub_server import serve_stub
+
+HOST = "human-pangenomics.s3.amazonaws.com"
+THROTTLED_URLS = {429: f"https://{HOST}/throttled-429.bam", 503: f"https://{HOST}/throttled-503.bam"}
+
+
+class TestHostRateController(unittest.TestCase):
+    def setUp(self):
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        cassette = Cassette(folder.name)
+        for status, url in THROTTLED_URLS.items():
+            cassette.record("HEAD", url, status, {"Retry-After": "0"}, b"")
+        stub = serve_stub(cassette)
+        self.requests = stub.__enter__()
+        self.addCleanup(stub.__exit__, None, None, None)
+        self.http_session = make_session()
+        self.addCleanup(self.http_session.close)
+
+    def get_limit(self, controller):
+        return controller.hosts[HOST].limit
+
+    def test_limit_is_cut_on_throttling_and_ramps_back_up(self):
+        for status, url in THROTTLED_URLS.items():
+            with self.subTest(status=status):
+                controller = HostRateController(8, initial_concurrency=4)
+                session = RateControlledSession(self.http_session, controller)
+                self.assertEqual(session.head(url).status_code, status)
+                # Each retry was sent after the previous cut, so the limit is halved every time, down to one request at a time
+                stats = controller.get_host_stats()[HOST]
+                self.assertEqual(stats["throttled_requests"], MAX_THROTTLING_RETRIES + 1)
+                self.assertEqual(self.get_limit(controller), 1)
+                # The limit then grows by one per limit's worth of healthy responses
+                limits = []
+                for i in range(60):
+                    self.assertEqual(session.head(f"https://{HOST}/file-{i}.bam").status_code, 200)
+                    limits.append(self.get_limit(controller))
+                self.assertEqual([round(limit, 3) for limit in limits[:3]], [2, 2.5, 2.9])
+                self.assertEqual(limits, sorted(limits))
+                self.assertEqual(int(limits[6]), 4)
+                self.assertEqual(limits[-1], 8)
+                self.assertEqual(controller.get_host_stats()[HOST]["concurrency_limit"], 8)
+
+    def test_throttling_only_cuts_once_for_requests_in_flight(self):
+        controller = HostRateController(8, initial_concurrency=4)
+        tickets = [controller.acquire(HOST) for _ in range(4)]
+        for ticket in tickets:
+            controller.release(HOST, ticket, 503, 0)
+        self.assertEqual(self.get_limit(controller), 2)
+        ticket = controller.acquire(HOST)
+        controller.release(HOST, ticket, 429, 0)
+        self.assertEqual(self.get_limit(controller), 1)
+        self.assertEqual(self.requests, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
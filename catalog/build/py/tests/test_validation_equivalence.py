@@ -0,0 +1,178 @@
+import os
+import unittest
+import warnings
+from unittest import mock
+import numpy as np
+import pandas as pd
+from linkml_runtime import SchemaView
+import build_help
+import compiled_validation
+from build_help import ARROW_STRING_DTYPE, HprcFieldValidationError, cast_column, cast_df, get_field_type_mappers, get_parallel_df_validation_errors, validate_and_normalize_df, validate_rows
+from tests.fixtures.measurements import Measurement, ReleaseOneMeasurement
+from tests.per_row_validation import get_per_row_validation_errors
+
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures/measurements.yaml")
+
+SAMPLE_IDS = ["HG00097", "NA12878", "HG0009", "hg00097", "HG00097 ", "", "NA123456"]
+PLATFORMS = ["ILLUMINA", "PACBIO_SMRT", "OXFORD_NANOPORE", "illumina", "", "NANOPORE"]
+HAPLOTYPES = ["0", "1", "2", "3", "-1", "+2", " 1", "1_0", "١", "1.0", "", "nan", "x", "99999999999999999999"]
+COVERAGES = ["30.5", "0", "100", "100.5", "-0.1", "1e2", "1e3", ".5", "5.", "inf", "nan", "NaN", "", "thirty", " 7 ", "1_000"]
+BOOLEANS = ["TRUE", "FALSE", "", "true", "1", "yes"]
+NOTES = ["", "Resequenced", "N/A", " "]
+
+
+def make_df(rows, seed=0):
+    """
+    Make a dataframe of source values for the fixture schema, cycling through each column's values at different rates so that they're combined in many ways.
+    """
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        name: rng.choice(np.array(values, dtype=object), rows)
+        for name, values in (("sample_id", SAMPLE_IDS), ("platform", PLATFORMS), ("haplotype", HAPLOTYPES), ("coverage", COVERAGES), ("is_phased", BOOLEANS), ("notes", NOTES))
+    })
+
+def with_nan(df, seed=0):
+    """
+    Replace some of the values of each column with NaN, as the values of columns missing from some of the concatenated source files are.
+    """
+    rng = np.random.default_rng(seed)
+    return df.mask(rng.random(df.shape) < 0.1)
+
+def get_errors(errors):
+    return [(err.message, err.row, err.field) for err in errors]
+
+
+class TestValidationEquivalence(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.schemaview = SchemaView(SCHEMA_PATH)
+
+    def assert_same_errors(self, df, model, row_offset=0):
+        expected_errors = get_per_row_validation_errors(df, model, self.schemaview, row_offset)
+        for compiled in (True, False):
+            with self.subTest(compiled=compiled), mock.patch.object(compiled_validation, "COMPILED_VALIDATION", compiled):
+                compiled_validation.compile_model_checks.cache_clear()
+                try:
+                    with warnings.catch_warnings():
+                        warnings.simplefilter("error", RuntimeWarning)
+                        _, errors = validate_and_normalize_df(df, model, self.schemaview, row_offset)
+                finally:
+                    compiled_validation.compile_model_checks.cache_clear()
+                self.assertEqual(get_errors(errors), expected_errors)
+        return expected_errors
+
+    def test_object_frames(self):
+        for seed in range(3):
+            df = make_df(400, seed)
+            with self.subTest(seed=seed):
+                self.assertTrue(self.assert_same_errors(df, Measurement, row_offset=seed * 400))
+
+    def test_frames_with_nan(self):
+        for seed in range(3):
+            df = with_nan(make_df(400, seed), seed)
+            with self.subTest(seed=seed):
+                self.assert_same_errors(df, Measurement)
+
+    def test_arrow_string_frames(self):
+        for seed in range(3):
+            df = make_df(400, seed).astype(ARROW_STRING_DTYPE)
+            with self.subTest(seed=seed):
+                self.assert_same_errors(df, Measurement)
+
+    def test_valid_rows(self):
+        df = pd.DataFrame({
+            "sample_id": ["HG00097", "NA12878", "HG00099"],
+            "platform": ["ILLUMINA", "PACBIO_SMRT", "OXFORD_NANOPORE"],
+            "haplotype": ["0", "1", "2"],
+            "coverage": ["30.5", "", "1e2"],
+            "is_phased": ["TRUE", "FALSE", ""],
+            "notes": ["", "Resequenced", "N/A"],
+        })
+        self.assertEqual(self.assert_same_errors(df, Measurement), [])
+        self.assertEqual(self.assert_same_errors(df.astype(ARROW_STRING_DTYPE), Measurement), [])
+
+    def test_non_applicable_slots(self):
+        df = make_df(200)
+        self.assert_same_errors(df, ReleaseOneMeasurement)
+        self.assert_same_errors(with_nan(df), ReleaseOneMeasurement)
+
+    def test_missing_columns(self):
+        df = make_df(200)
+        self.assert_same_errors(df.drop(columns=["coverage", "is_phased", "notes"]), Measurement)
+        self.assert_same_errors(df.drop(columns=["haplotype"]), Measurement)
+
+    def test_duplicate_columns(self):
+        df = make_df(200)
+        duplicated_df = pd.concat([df, make_df(200, seed=1)[["haplotype", "platform"]]], axis=1)
+        with warnings.catch_warnings():
+            # Raised when the per-row reference converts the rows to dicts
+            warnings.filterwarnings("ignore", "DataFrame columns are not unique", UserWarning)
+            self.assert_same_errors(duplicated_df, Measurement)
+            self.assert_same_errors(duplicated_df.astype(ARROW_STRING_DTYPE), Measurement)
+            self.assert_same_errors(duplicated_df, ReleaseOneMeasurement)
+
+    def test_parallel_validation(self):
+        df = with_nan(make_df(600))
+        expected_errors = get_per_row_validation_errors(df, Measurement, self.schemaview, 10)
+        with mock.patch.object(build_help, "VALIDATION_PROCESSES", 2), mock.patch.object(build_help, "VALIDATION_CHUNK_MIN_ROWS", 100):
+            self.assertEqual(get_errors(get_parallel_df_validation_errors(df, Measurement, self.schemaview, 10)), expected_errors)
+        build_help.get_validation_executor().shutdown()
+        build_help.get_validation_executor.cache_clear()
+
+
+class TestCasting(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.field_type_mappers = get_field_type_mappers(SchemaView(SCHEMA_PATH), Measurement)
+
+    def cast_scalars(self, values, mapper):
+        cast_values = []
+        for value in values:
+            try:
+                cast_values.append(None if value == "" else mapper(value, None, None))
+            except HprcFieldValidationError:
+                cast_values.append(HprcFieldValidationError)
+        return cast_values
+
+    def test_cast_column_matches_scalar_casts(self):
+        for name, values in (("haplotype", HAPLOTYPES), ("coverage", COVERAGES), ("is_phased", BOOLEANS)):
+            mapper = self.field_type_mappers[name]
+            expected_values = self.cast_scalars(values, mapper)
+            for dtype in (object, ARROW_STRING_DTYPE):
+                with self.subTest(name=name, dtype=dtype):
+                    cast_values, is_failed = cast_column(pd.Series(values, dtype=dtype), mapper)
+                    self.assertEqual(is_failed.tolist(), [value is HprcFieldValidationError for value in expected_values])
+                    for value, expected_value, failed in zip(cast_values.tolist(), expected_values, is_failed.tolist()):
+                        if not failed:
+                            self.assertIs(type(value), type(expected_value))
+                            self.assertTrue(value == expected_value or (value != value and expected_value != expected_value))
+
+    def test_cast_df_reports_first_failing_column(self):
+        df = pd.DataFrame({"haplotype": ["x", "1", "y"], "coverage": ["1", "z", "z"], "notes": ["", "", ""]})
+        columns, cast_errors = cast_df(df, self.field_type_mappers, row_offset=5)
+        self.assertEqual(list(columns.keys()), ["haplotype", "coverage", "notes"])
+        self.assertEqual({i: (err.message, err.row, err.field) for i, err in cast_errors.items()}, {
+            0: ("Unable to parse value as integer", 7, "haplotype"),
+            1: ("Unable to parse value as float", 8, "coverage"),
+            2: ("Unable to parse value as integer", 9, "haplotype"),
+        })
+
+    def test_validate_rows_matches_model_validate(self):
+        rows = [
+            {"sample_id": "HG00097", "platform": "ILLUMINA", "haplotype": 1},
+            {"sample_id": "HG0009", "platform": "illumina", "haplotype": 3, "coverage": float("nan")},
+            {"sample_id": None, "platform": "OXFORD_NANOPORE", "haplotype": None, "is_phased": True},
+        ]
+        errors_by_position = validate_rows(rows, Measurement)
+        self.assertEqual(sorted(errors_by_position.keys()), [1, 2])
+        for i, row in enumerate(rows):
+            try:
+                Measurement.model_validate(row)
+                expected_errors = []
+            except build_help.ValidationError as err:
+                expected_errors = [(e["msg"], e["loc"]) for e in err.errors()]
+            self.assertEqual([(e["msg"], e["loc"]) for e in errors_by_position.get(i, [])], expected_errors)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,6 @@
 import os
 from linkml_runtime import SchemaView
-from build_help import format_file_errors, load_and_validate_csv
+from build_help import SPEC_DRY_RUN, format_file_errors, load_and_validate_csv, take_source_parse_stats
 from reports import EntityTypeReport, get_error_strings_for_file, generate_catalog_report
 from generated_schema.alignments import Alignment
 
@@ -14,13 +14,17 @@ ALIGNMENTS_SCHEMA_PATH = os.path.join(BASE_DIR, "../../schema/alignments.yaml")
 ALIGNMENTS_SCHEMAVIEW = SchemaView(ALIGNMENTS_SCHEMA_PATH)
 
 def validate_alignments():
+    if SPEC_DRY_RUN:
+        print(f"Alignments file: {FILE_PATH}")
+        return
     errors = load_and_validate_csv(FILE_PATH, Alignment, ALIGNMENTS_SCHEMAVIEW)[1]
     if errors:
         print(f"\nValidation errors:\n\n{format_file_errors(errors)}")
         print(f"\nFound errors in file")
     
     EntityTypeReport(
-        validation_errors=[get_error_strings_for_file(os.path.basename(FILE_PATH), errors)]
+        validation_errors=[get_error_strings_for_file(os.path.basename(FILE_PATH), errors)],
+        parse_stats=take_source_parse_stats()
     ).save_to(REPORT_PATH)
 
 if __name__ == "__main__":